@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import random
+import time
+import traceback
+from collections import deque
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from BroomStick import BroomStick
+    from BroomStick.data_class.RequestContext import RequestContext
+
+
+class AccessLog:
+
+    # one JSON line per proxied request. requests only append to an in memory buffer, a background
+    # task writes it out in batches and whatever does not fit into the buffer is dropped and counted
+    def __init__(self, main: BroomStick):
+        self.main: BroomStick = main
+        self.config = self.main.config.get("accessLog", {})
+        self.buffer_size = self.config.get("bufferSize", 10000)
+        self.batch_size = self.config.get("batchSize", 500)
+
+        self.buffer = deque()
+        self.file = None
+        self.collection = None
+        if self.config.get("type", "file") == "mongo":
+            self.collection = self.main.mongo["BroomStick"][self.config.get("collection", "accessLog")]
+
+        self.wakeup: Optional[asyncio.Event] = None
+        self.task: Optional[asyncio.Task] = None
+
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def is_enabled(self):
+        return self.config.get("enabled", False)
+
+    def is_sampled(self, context: RequestContext, status_code: int) -> bool:
+        # server errors are always kept, everything else is sampled per route
+        if status_code >= 500 and self.config.get("alwaysLogErrors", True):
+            return True
+        sample_rate = None
+        if context.route is not None:
+            sample_rate = context.route.route_info_function.get_access_log_sample_rate()
+        if sample_rate is None:
+            sample_rate = self.config.get("sampleRate", 1.0)
+        return sample_rate >= 1 or random.random() < sample_rate
+
+    def log(self, context: RequestContext, status_code: int, size: int):
+        if not self.is_enabled() or not self.is_sampled(context, status_code):
+            return
+        if len(self.buffer) >= self.buffer_size:
+            self.dropped += 1
+            return
+
+        request = context.request
+        user = context.get_user()
+        client = request.scope.get("client")
+        self.buffer.append({
+            "time": time.time(),
+            "method": request.method,
+            "host": request.url.hostname,
+            "path": request.url.path,
+            "route": context.route.route_info_function.get_path() if context.route is not None else None,
+            "status": status_code,
+            "backend": context.backend,
+            "userId": user.user_id if user is not None else None,
+            "client": client[0] if client else None,
+            "bytes": size,
+            "duration": round(context.get_elapsed(), 6),
+            "timings": {stage: round(seconds, 6) for stage, seconds in context.timings.items()},
+            "authFailure": context.data.get("authFailure"),
+        })
+        if len(self.buffer) >= self.batch_size and self.wakeup is not None:
+            self.wakeup.set()
+
+    def log_event(self, event: str, data: dict):
+        # gateway events go into the same sink as the requests, never sampled
+        if not self.is_enabled():
+            return
+        if len(self.buffer) >= self.buffer_size:
+            self.dropped += 1
+            return
+        entry = {"time": time.time(), "event": event}
+        entry.update(data)
+        self.buffer.append(entry)
+
+    def start(self):
+        if not self.is_enabled() or self.task is not None:
+            return
+        if self.collection is None:
+            self.file = open(self.config.get("path", "access.log"), "a")
+        self.wakeup = asyncio.Event()
+        self.task = asyncio.ensure_future(self.write_loop())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        while len(self.buffer) != 0:
+            await self.flush()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    async def write_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.config.get("flushInterval", 1.0))
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            while len(self.buffer) != 0:
+                await self.flush()
+                if len(self.buffer) < self.batch_size:
+                    break
+
+    def take_batch(self) -> list:
+        batch = []
+        while len(self.buffer) != 0 and len(batch) < self.batch_size:
+            batch.append(self.buffer.popleft())
+        return batch
+
+    def write_lines(self, batch: list):
+        self.file.write("".join(json.dumps(entry, separators=(",", ":")) + "\n" for entry in batch))
+        self.file.flush()
+
+    async def flush(self):
+        batch = self.take_batch()
+        if len(batch) == 0:
+            return
+        try:
+            if self.collection is not None:
+                await self.collection.insert_many(batch, ordered=False)
+            else:
+                await asyncio.get_event_loop().run_in_executor(None, self.write_lines, batch)
+            self.written += len(batch)
+        except Exception:
+            # a failing sink loses the batch, the proxy path never waits on it
+            self.failed += len(batch)
+            traceback.print_exc()
@@ -0,0 +1,90 @@
+import asyncio
+import math
+from collections import deque
+
+
+class ConcurrencyLimiter:
+
+    # caps the requests in flight, a bounded queue with a deadline absorbs short bursts and
+    # everything beyond that is shed right away instead of piling up
+    def __init__(self, config: dict):
+        self.config = config
+        self.limit = float(config.get("limit", 100))
+        self.min_limit = config.get("minLimit", 1)
+        self.max_limit = config.get("maxLimit", max(self.limit, 1000))
+        self.queue_size = config.get("queueSize", 0)
+        self.queue_timeout = config.get("queueTimeout", 1.0)
+        self.adaptive = config.get("adaptive")
+
+        self.in_flight = 0
+        self.waiters = deque()
+        self.shed = 0
+
+        # gradient limiter state
+        self.min_latency = None
+        self.samples = 0
+
+    def has_capacity(self) -> bool:
+        return self.in_flight < max(self.min_limit, int(self.limit))
+
+    async def acquire(self) -> bool:
+        if len(self.waiters) == 0 and self.has_capacity():
+            self.in_flight += 1
+            return True
+        if len(self.waiters) >= self.queue_size:
+            self.shed += 1
+            return False
+
+        future = asyncio.get_event_loop().create_future()
+        self.waiters.append(future)
+        try:
+            # release() hands its slot straight to the oldest waiter
+            await asyncio.wait_for(future, self.queue_timeout)
+            return True
+        except asyncio.TimeoutError:
+            self.shed += 1
+            return False
+        except asyncio.CancelledError:
+            # the slot may have been handed over just before the request went away
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+        finally:
+            try:
+                self.waiters.remove(future)
+            except ValueError:
+                pass
+
+    def release(self, latency: float = None, failed: bool = False):
+        self.in_flight = max(0, self.in_flight - 1)
+        if latency is not None:
+            self.on_sample(latency, failed)
+        while len(self.waiters) != 0 and self.has_capacity():
+            future = self.waiters.popleft()
+            if future.done():
+                continue
+            self.in_flight += 1
+            future.set_result(None)
+
+    def on_sample(self, latency: float, failed: bool):
+        if self.adaptive == "aimd":
+            threshold = self.config.get("latencyThreshold")
+            if failed or (threshold is not None and latency > threshold):
+                self.limit = max(self.min_limit, self.limit * self.config.get("backoffRatio", 0.9))
+            elif self.in_flight * 2 >= self.limit:
+                # only grow while the limit is actually being used
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        elif self.adaptive == "gradient":
+            self.samples += 1
+            if self.min_latency is None or latency < self.min_latency:
+                self.min_latency = latency
+            if failed or latency <= 0:
+                gradient = 0.5
+            else:
+                gradient = max(0.5, min(1.0, self.config.get("tolerance", 2.0) * self.min_latency / latency))
+            new_limit = self.limit * gradient + math.sqrt(self.limit)
+            smoothing = self.config.get("smoothing", 0.2)
+            self.limit = max(self.min_limit, min(self.max_limit, self.limit * (1 - smoothing) + new_limit * smoothing))
+            # forget the baseline now and then so a backend that got slower for good is relearned
+            if self.samples % self.config.get("probeInterval", 1000) == 0:
+                self.min_latency = None
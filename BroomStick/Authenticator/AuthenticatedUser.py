@@ -1,10 +1,12 @@
 
 class AuthenticatedUser:
 
-    def __init__(self, user_id, username, metadata):
+    def __init__(self, user_id, username, metadata, token_version=0):
         self.user_id = user_id
         self.username = username
         self.metadata = metadata
+        # tokens issued with an older version were revoked, e.g. by a password change
+        self.token_version = token_version
 
     def get_user_id(self):
         return self.user_id
@@ -1,26 +1,41 @@
 from __future__ import annotations
 
+import asyncio
 import base64
 import datetime
 import hashlib
+import json
 import traceback
 import uuid
-from typing import TYPE_CHECKING, Optional, Dict, Any
+from typing import TYPE_CHECKING, Optional, Dict, Any, Tuple
 
 import requests
-from expiring_dict import ExpiringDict
 from pydantic import BaseModel
 from fastapi import Request, HTTPException
 from fastapi.responses import PlainTextResponse
 import jwt
 
 from BroomStick.Authenticator.AuthenticatedUser import AuthenticatedUser
+from BroomStick.Authenticator.BloomFilter import BloomFilter
+from BroomStick.Authenticator.NegativeCache import NegativeCache
+from BroomStick.Authenticator.RefreshAheadCache import RefreshAheadCache
+from BroomStick.Authenticator.TokenCache import TokenCache
+from BroomStick.Authenticator.UserRepository import UserRepository
 from BroomStick.data_class.APIResponse import CommonAPIResponse
 
 if TYPE_CHECKING:
     from BroomStick import BroomStick
 
 
+INVALIDATION_TTL = 300
+INVALIDATION_GENERATION_TTL = 365 * 24 * 60 * 60
+
+
+def digest_api_key(api_key: str) -> str:
+    # api keys are bearer credentials, caches, filters and broadcasts only ever hold their digest
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+
 class RegisterRequest(BaseModel):
     username: str
     password: str
@@ -37,13 +52,36 @@ class Authenticator:
 
     def __init__(self, main: BroomStick):
         self.main: BroomStick = main
-        self.cached_users = ExpiringDict(self.main.config["userCacheTime"])
+        self.users = UserRepository(self.main)
+        self.cached_users = self.create_user_cache(self.load_user)
 
-        self.token_user_id_cache = ExpiringDict(self.main.config["userCacheTime"])
-        self.api_key_user_id_cache = ExpiringDict(self.main.config["userCacheTime"])
+        self.token_user_id_cache = TokenCache(self.main.config.get("jwtCacheSize", 10000))
+        self.api_key_user_id_cache = self.create_user_cache(self.load_user_id_for_api_key)
+
+        # unknown api keys are answered without a database round trip
+        negative_cache_config = self.main.config.get("apiKeyNegativeCache", {})
+        self.unknown_api_keys = NegativeCache(negative_cache_config.get("size", 10000), negative_cache_config.get("ttl", 30))
+        self.api_key_filter: Optional[BloomFilter] = None
+        # the filter being rebuilt, new keys go into both until it replaces the current one
+        self.next_api_key_filter: Optional[BloomFilter] = None
+        self.api_key_filter_ready = False
+        self.api_key_filter_task: Optional[asyncio.Task] = None
+
+        # invalidations from other workers are picked up through the state store
+        self.invalidation_generation = 0
+        self.invalidation_task: Optional[asyncio.Task] = None
 
         self.register_routes()
 
+    def create_user_cache(self, loader) -> RefreshAheadCache:
+        return RefreshAheadCache(
+            loader,
+            self.main.config.get("userCacheSize", 10000),
+            self.main.config["userCacheTime"],
+            self.main.config.get("userCacheRefreshAhead", 0.8),
+            self.main.config.get("userCacheMaxStale", 5)
+        )
+
     def register_routes(self):
 
         @self.main.app.post("/register")
@@ -51,7 +89,7 @@ class Authenticator:
             if 'Authorization' not in request.headers or self.main.config['AuthorizationAPIKey'] != request.headers['Authorization']:
                 return CommonAPIResponse.UnAuthorized.get_response_object()
             try:
-                self.create_user(register.userId, register.username, register.password, register.metadata)
+                await self.create_user(register.userId, register.username, register.password, register.metadata)
             except Exception as ex:
                 return CommonAPIResponse.InternalError.get_response_object()
             return CommonAPIResponse.Success.get_response_object()
@@ -60,16 +98,16 @@ class Authenticator:
         async def authenticate(request: Request, auth: AuthenticationRequest):
             # if 'Authorization' not in request.headers or self.main.config['AuthorizationAPIKey'] != request.headers['Authorization']:
             #     return CommonAPIResponse.UnAuthorized.get_response_object()
-            token = self.authenticate(auth.username, auth.password)
+            token = await self.authenticate(auth.username, auth.password)
             if not token:
                 return CommonAPIResponse.UnAuthorized.get_response_object()
             # return PlainTextResponse(token)
-            user = self.get_user(token)
+            user = await self.get_user(token)
             response = CommonAPIResponse.Success
-            response.data = self.create_api_key_for_user(user.user_id)
+            response.data = await self.create_api_key_for_user(user.user_id)
             return response.get_response_object()
 
-    def create_user(self, user_id, username, password, metadata=None):
+    async def create_user(self, user_id, username, password, metadata=None):
         # Hash the password using SHA256
         hashedPassword = self.hash_password(password)
         if metadata is None:
@@ -82,29 +120,139 @@ class Authenticator:
             "password": hashedPassword,
             "metadata": metadata
         }
-        # if user already exists, update only the password
-        if self.main.mongo["BroomStick"]["users"].find_one({"userId": user_id}):
+        # if user already exists, update only the password and revoke the tokens issued with the old one
+        existing = await self.users.find_by_user_id(user_id)
+        if existing:
             user = {
                 "password": hashedPassword
             }
-        self.main.mongo["BroomStick"]["users"].update_one({"userId": user_id}, {"$set": user}, upsert=True)
-        if user_id in self.cached_users:
-            del self.cached_users[user_id]
+        await self.users.upsert_user(user_id, user)
+        if existing:
+            await self.users.revoke_tokens(user_id)
+        await self.invalidate_user(user_id)
+
+    def invalidate_user_locally(self, user_id: str):
+        # a cache refresh, the next lookup reads the user again and with it the current token version
+        self.cached_users.invalidate(user_id)
+        self.token_user_id_cache.invalidate_user(user_id)
+
+    def add_api_key_locally(self, api_key_digest: str):
+        self.unknown_api_keys.remove(api_key_digest)
+        self.api_key_user_id_cache.invalidate(api_key_digest)
+        if self.api_key_filter is not None:
+            self.api_key_filter.add(api_key_digest)
+        if self.next_api_key_filter is not None:
+            self.next_api_key_filter.add(api_key_digest)
+
+    def apply_invalidation(self, user_id: str, api_key_digest: str = None, revoked_api_key_digest: str = None):
+        self.invalidate_user_locally(user_id)
+        if api_key_digest is not None:
+            self.add_api_key_locally(api_key_digest)
+        if revoked_api_key_digest is not None:
+            self.api_key_user_id_cache.invalidate(revoked_api_key_digest)
+
+    async def invalidate_user(self, user_id: str, api_key: str = None, revoked_api_key: str = None):
+        api_key_digest = digest_api_key(api_key) if api_key is not None else None
+        revoked_api_key_digest = digest_api_key(revoked_api_key) if revoked_api_key is not None else None
+        self.apply_invalidation(user_id, api_key_digest, revoked_api_key_digest)
+        store = self.main.state_store
+        if not store.is_shared():
+            return
+        # other workers also need to learn about new api keys, or their filters would reject them
+        message = json.dumps({"userId": user_id, "apiKeyDigest": api_key_digest, "revokedApiKeyDigest": revoked_api_key_digest}).encode("utf-8")
+        generation = int(await store.incr("auth:generation", 1, INVALIDATION_GENERATION_TTL))
+        await store.set("auth:invalidated:" + str(generation), message, INVALIDATION_TTL)
+        # this worker already applied its own invalidation
+        if generation == self.invalidation_generation + 1:
+            self.invalidation_generation = generation
+
+    async def start(self):
+        await self.start_invalidation_listener()
+        self.start_api_key_filter()
+
+    async def stop(self):
+        await self.stop_invalidation_listener()
+        if self.api_key_filter_task is not None:
+            self.api_key_filter_task.cancel()
+            self.api_key_filter_task = None
+
+    def start_api_key_filter(self):
+        config = self.main.config.get("apiKeyBloomFilter", {})
+        if not config.get("enabled", False) or self.api_key_filter_task is not None:
+            return
+        # the filter rejects keys it has not seen, keys created by other workers or hosts only reach it through the shared store
+        if not self.main.state_store.is_shared():
+            self.main.access_log.log_event("apiKeyFilterDisabled", {"reason": "state store is not shared"})
+            return
+        self.api_key_filter_task = asyncio.ensure_future(self.maintain_api_key_filter(config))
+
+    async def maintain_api_key_filter(self, config: dict):
+        # rebuilt now and then as a safety net for missed broadcasts, revoked keys drop out with it
+        while True:
+            try:
+                await self.load_api_key_filter(config)
+            except Exception:
+                traceback.print_exc()
+            await asyncio.sleep(config.get("rebuildInterval", 300))
 
-    def authenticate(self, username, password):
+    async def load_api_key_filter(self, config: dict):
+        # keys created while this runs are added to the new filter as well, it only starts
+        # rejecting once every stored key is in
+        self.next_api_key_filter = BloomFilter(config.get("expectedKeys", 100000), config.get("falsePositiveRate", 0.01))
+        try:
+            async for api_key in self.users.iter_api_keys():
+                self.next_api_key_filter.add(digest_api_key(api_key))
+            self.api_key_filter = self.next_api_key_filter
+            self.api_key_filter_ready = True
+        finally:
+            self.next_api_key_filter = None
+
+    async def start_invalidation_listener(self):
+        store = self.main.state_store
+        if not store.is_shared() or self.invalidation_task is not None:
+            return
+        self.invalidation_generation = int(await store.get_counter("auth:generation"))
+        self.invalidation_task = asyncio.ensure_future(self.listen_for_invalidations())
+
+    async def stop_invalidation_listener(self):
+        if self.invalidation_task is None:
+            return
+        self.invalidation_task.cancel()
+        try:
+            await self.invalidation_task
+        except asyncio.CancelledError:
+            pass
+        self.invalidation_task = None
+
+    async def listen_for_invalidations(self):
+        store = self.main.state_store
+        poll_interval = self.main.config.get("stateStore", {}).get("pollInterval", 1)
+        while True:
+            await asyncio.sleep(poll_interval)
+            try:
+                generation = int(await store.get_counter("auth:generation"))
+                for missed in range(self.invalidation_generation + 1, generation + 1):
+                    message = await store.get("auth:invalidated:" + str(missed))
+                    if message is None:
+                        continue
+                    message = json.loads(message)
+                    self.apply_invalidation(message["userId"], message.get("apiKeyDigest"), message.get("revokedApiKeyDigest"))
+                self.invalidation_generation = max(self.invalidation_generation, generation)
+            except Exception:
+                traceback.print_exc()
+
+    async def authenticate(self, username, password):
         # Hash the password using SHA256
         hashedPassword = self.hash_password(password)
 
         # Find the user with the given username and password
-        result = self.main.mongo["BroomStick"]["users"].find_one({
-            "username": username,
-            "password": hashedPassword
-        })
+        result = await self.users.find_by_credentials(username, hashedPassword)
 
         if result is not None:
             # Generate a JWT token for the authenticated user
             tokenDescriptor = {
                 "sub": {"userId": result["userId"]},
+                "ver": result.get("tokenVersion", 0),
                 "exp": datetime.datetime.utcnow() + datetime.timedelta(seconds=self.main.config["jwtActiveTime"])
             }
             jwt_assertion = jwt.encode(
@@ -116,60 +264,77 @@ class Authenticator:
             # Return None if the authentication failed
             return None
 
-    def create_api_key_for_user(self, user_id):
+    async def create_api_key_for_user(self, user_id):
         api_key = str(uuid.uuid4())
-        self.main.mongo["BroomStick"]["users"].update_one({"userId": user_id}, {"$set": {"apiKey": api_key}})
-        if user_id in self.api_key_user_id_cache:
-            del self.api_key_user_id_cache[user_id]
+        # the replaced key must stop resolving to this user right away
+        user = await self.users.find_by_user_id(user_id)
+        revoked_api_key = user.get("apiKey") if user is not None else None
+        await self.users.set_api_key(user_id, api_key)
+        await self.invalidate_user(user_id, api_key, revoked_api_key)
         return api_key
 
-    def get_user(self, token: str = None, api_key: str = None, user_id: str = None, authorization_token: str = None) -> Optional[AuthenticatedUser]:
+    async def get_user(self, token: str = None, api_key: str = None, user_id: str = None, authorization_token: str = None) -> Optional[AuthenticatedUser]:
         if authorization_token is not None:
             scheme, _, authorization_token = authorization_token.partition(" ")
             if scheme.lower() == "bearer":
-                return self.get_user(api_key=authorization_token)
+                return await self.get_user(api_key=authorization_token)
             if scheme.lower() == "basic":
                 authorization_token = authorization_token.encode("utf-8")
                 authorization_token = base64.b64decode(authorization_token).decode("utf-8")
                 authorization_token = authorization_token.partition(":")[0]
-                return self.get_user(api_key=authorization_token)
-            return self.get_user(token=authorization_token)
+                return await self.get_user(api_key=authorization_token)
+            return await self.get_user(token=authorization_token)
         if user_id is not None:
-            if user_id in self.cached_users:
-                return self.cached_users[user_id]
-            user = self.main.mongo["BroomStick"]["users"].find_one({"userId": user_id})
-            if user is not None:
-                user = AuthenticatedUser(user_id, user["username"], user.get("metadata", {}))
-                self.cached_users[user_id] = user
-                return user
-            return None
+            return await self.cached_users.get(user_id)
 
         if token is not None:
-            return self.get_user(user_id=self.get_user_id_from_jwt(token))
+            claims = self.get_token_claims(token)
+            if claims is None:
+                return None
+            user = await self.get_user(user_id=claims[0])
+            if user is not None and claims[1] < user.token_version:
+                return None
+            return user
 
         if api_key is not None:
-            return self.get_user(user_id=self.get_user_id_from_api_key(api_key))
+            return await self.get_user(user_id=await self.get_user_id_from_api_key(api_key))
 
-    def get_user_id_from_jwt(self, token: str) -> Optional[AuthenticatedUser]:
+    def get_token_claims(self, token: str) -> Optional[Tuple[str, int]]:
+        # tokens that already passed verification are served from the cache until they expire
+        claims = self.token_user_id_cache.get(token)
+        if claims is not None:
+            return claims
         try:
             data = jwt.decode(token, self.main.config["tokenSecret"], algorithms=["HS256"])
-            # check if user is already in the cache
-            if token in self.token_user_id_cache:
-                return self.token_user_id_cache[token]
-
             userId = data["sub"]["userId"]
-            return userId
+            token_version = data.get("ver", 0)
+            self.token_user_id_cache.put(token, userId, token_version, data.get("exp"))
+            return userId, token_version
         except Exception as e:
             pass
         return None
 
-    def get_user_id_from_api_key(self, api_key: str) -> Optional[str]:
-        if api_key in self.api_key_user_id_cache:
-            return self.api_key_user_id_cache[api_key]
-        user = self.main.mongo["BroomStick"]["users"].find_one({"apiKey": api_key})
+    async def load_user(self, user_id: str) -> Optional[AuthenticatedUser]:
+        user = await self.users.find_by_user_id(user_id)
+        if user is None:
+            return None
+        return AuthenticatedUser(user_id, user["username"], user.get("metadata", {}), user.get("tokenVersion", 0))
+
+    async def get_user_id_from_api_key(self, api_key: str) -> Optional[str]:
+        # cached by digest, only the database lookup needs the key itself
+        return await self.api_key_user_id_cache.get(digest_api_key(api_key), api_key)
+
+    async def load_user_id_for_api_key(self, api_key: str) -> Optional[str]:
+        api_key_digest = digest_api_key(api_key)
+        if self.api_key_filter_ready and api_key_digest not in self.api_key_filter:
+            self.main.metrics.auth_cache.inc(("api_key_bloom_filter", "reject"))
+            return None
+        if self.unknown_api_keys.contains(api_key_digest):
+            return None
+        user = await self.users.find_by_api_key(api_key)
         if user is not None:
-            self.api_key_user_id_cache[api_key] = user["userId"]
             return user["userId"]
+        self.unknown_api_keys.add(api_key_digest)
         return None
 
     def hash_password(self, password):
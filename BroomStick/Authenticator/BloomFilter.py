@@ -0,0 +1,32 @@
+import hashlib
+import math
+
+
+class BloomFilter:
+
+    # answers "definitely not present" without false negatives, sized for the expected
+    # number of items at the given false positive rate
+    def __init__(self, expected_items: int, false_positive_rate: float = 0.01):
+        expected_items = max(1, expected_items)
+        self.size = max(8, int(-expected_items * math.log(false_positive_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, int(round(self.size / expected_items * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def get_positions(self, key: str):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hash_count):
+            yield (first + i * second) % self.size
+
+    def add(self, key: str):
+        for position in self.get_positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        for position in self.get_positions(key):
+            if not self.bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
@@ -0,0 +1,46 @@
+import hashlib
+import time
+from collections import OrderedDict
+
+
+class NegativeCache:
+
+    # remembers credentials that matched nothing for a short while, keyed by digest so
+    # arbitrarily long garbage keys cost the same few bytes
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries: OrderedDict = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def digest(key: str) -> bytes:
+        return hashlib.sha256(key.encode("utf-8")).digest()
+
+    def contains(self, key: str) -> bool:
+        digest = self.digest(key)
+        expires_at = self.entries.get(digest)
+        if expires_at is None or expires_at <= time.monotonic():
+            if expires_at is not None:
+                del self.entries[digest]
+            self.misses += 1
+            return False
+        self.hits += 1
+        return True
+
+    def add(self, key: str):
+        if self.max_size <= 0 or self.ttl <= 0:
+            return
+        digest = self.digest(key)
+        self.entries.pop(digest, None)
+        self.entries[digest] = time.monotonic() + self.ttl
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def remove(self, key: str):
+        self.entries.pop(self.digest(key), None)
+
+    def __len__(self):
+        return len(self.entries)
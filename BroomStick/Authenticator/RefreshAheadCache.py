@@ -0,0 +1,122 @@
+import asyncio
+import random
+import time
+import traceback
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class RefreshAheadEntry:
+    __slots__ = ("value", "refresh_at", "expires_at", "stale_until")
+
+    def __init__(self, value: Any, refresh_at: float, expires_at: float, stale_until: float):
+        self.value = value
+        self.refresh_at = refresh_at
+        self.expires_at = expires_at
+        self.stale_until = stale_until
+
+
+class RefreshAheadCache:
+
+    # LRU cache that reloads entries in the background shortly before they expire and keeps
+    # serving the last known value meanwhile, so hot keys never fall through to a synchronous load.
+    # past their ttl values are only served for max_stale seconds, they may be outdated by then
+    def __init__(self, loader: Callable[[Hashable], Awaitable[Any]], max_size: int, ttl: float, refresh_ratio: float = 0.8, max_stale: float = 5, jitter: float = 0.1, retry_interval: float = 1):
+        self.loader = loader
+        self.max_size = max_size
+        self.ttl = ttl
+        self.refresh_ratio = refresh_ratio
+        self.max_stale = max_stale
+        self.jitter = jitter
+        self.retry_interval = retry_interval
+        self.entries: OrderedDict = OrderedDict()
+
+        # one load per key at a time, misses and refreshes share it
+        self.loading: Dict[Hashable, asyncio.Future] = {}
+        self.generations: Dict[Hashable, int] = {}
+        # consulted on a miss before the loader, hands out (value, remaining ttl) once per key
+        self.warm_source: Optional[Callable[[Hashable], Optional[Tuple[Any, float]]]] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+    def put(self, key: Hashable, value: Any, ttl: float = None):
+        if self.max_size <= 0:
+            return
+        # spread expiry a little so keys loaded together do not all refresh together
+        ttl = (self.ttl if ttl is None else min(ttl, self.ttl)) * (1 - random.random() * self.jitter)
+        now = time.monotonic()
+        self.entries.pop(key, None)
+        self.entries[key] = RefreshAheadEntry(value, now + ttl * self.refresh_ratio, now + ttl, now + ttl + self.max_stale)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    async def get(self, key: Hashable, load_key: Hashable = None) -> Any:
+        # load_key is what the loader gets instead of key, for caches keyed by a digest of it
+        entry = self.entries.get(key)
+        now = time.monotonic()
+        if entry is not None and now < entry.stale_until:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            if now >= entry.refresh_at and key not in self.loading:
+                self.refreshes += 1
+                self.start_load(key, load_key)
+            return entry.value
+
+        self.misses += 1
+        future = self.loading.get(key)
+        if future is None and self.warm_source is not None:
+            warm = self.warm_source(key)
+            if warm is not None:
+                self.put(key, warm[0], warm[1])
+                return warm[0]
+        if future is None:
+            future = self.start_load(key, load_key)
+        return await asyncio.shield(future)
+
+    def start_load(self, key: Hashable, load_key: Hashable = None) -> asyncio.Future:
+        future = asyncio.ensure_future(self.load(key, key if load_key is None else load_key, self.generations.get(key, 0)))
+        self.loading[key] = future
+        future.add_done_callback(lambda _: self.loading.pop(key, None) if self.loading.get(key) is future else None)
+        return future
+
+    async def load(self, key: Hashable, load_key: Hashable, generation: int) -> Any:
+        try:
+            value = await self.loader(load_key)
+        except Exception:
+            # a failed refresh keeps the stale value and waits a moment before the next attempt,
+            # a failed miss is reported to its callers
+            entry = self.entries.get(key)
+            if entry is not None:
+                traceback.print_exc()
+                entry.refresh_at = time.monotonic() + self.retry_interval
+                return entry.value
+            raise
+        # an invalidation while loading wins over the value that was read before it
+        if self.generations.get(key, 0) != generation:
+            if key not in self.loading:
+                self.generations.pop(key, None)
+            return value
+        if value is None:
+            self.entries.pop(key, None)
+        else:
+            self.put(key, value)
+        return value
+
+    def invalidate(self, key: Hashable):
+        self.entries.pop(key, None)
+        if self.warm_source is not None:
+            # consumed here so an invalidated value can not come back from the warm source later
+            self.warm_source(key)
+        if key in self.loading:
+            self.generations[key] = self.generations.get(key, 0) + 1
+            self.loading.pop(key, None)
+        else:
+            self.generations.pop(key, None)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,65 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+
+
+class TokenCache:
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        # digest -> (user_id, token_version, expires_at)
+        self.entries: OrderedDict = OrderedDict()
+        self.digests_by_user: Dict[str, Set[bytes]] = {}
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def get(self, token: str) -> Optional[Tuple[str, int]]:
+        digest = self.digest(token)
+        entry = self.entries.get(digest)
+        if entry is None:
+            self.misses += 1
+            return None
+        user_id, token_version, expires_at = entry
+        if expires_at <= time.time():
+            self.remove(digest)
+            self.misses += 1
+            return None
+        self.entries.move_to_end(digest)
+        self.hits += 1
+        return user_id, token_version
+
+    def put(self, token: str, user_id: str, token_version: int, expires_at: Optional[float]):
+        if self.max_size <= 0:
+            return
+        if expires_at is None:
+            expires_at = float("inf")
+        digest = self.digest(token)
+        self.remove(digest)
+        self.entries[digest] = (user_id, token_version, expires_at)
+        self.digests_by_user.setdefault(user_id, set()).add(digest)
+        while len(self.entries) > self.max_size:
+            self.remove(next(iter(self.entries)))
+
+    def remove(self, digest: bytes):
+        entry = self.entries.pop(digest, None)
+        if entry is None:
+            return
+        digests = self.digests_by_user.get(entry[0])
+        if digests is not None:
+            digests.discard(digest)
+            if len(digests) == 0:
+                del self.digests_by_user[entry[0]]
+
+    def invalidate_user(self, user_id: str):
+        # only drops cached verifications, revoking tokens is done through the user's token version
+        for digest in list(self.digests_by_user.get(user_id, ())):
+            self.remove(digest)
+
+    def __len__(self):
+        return len(self.entries)
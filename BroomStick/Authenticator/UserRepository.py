@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Optional
+
+import pymongo
+
+if TYPE_CHECKING:
+    from BroomStick import BroomStick
+
+
+class UserRepository:
+
+    def __init__(self, main: BroomStick):
+        self.main: BroomStick = main
+        self.collection = self.main.mongo["BroomStick"]["users"]
+
+    async def create_indexes(self):
+        await self.collection.create_index([("userId", pymongo.ASCENDING)])
+        await self.collection.create_index([("username", pymongo.ASCENDING)])
+        await self.collection.create_index([("apiKey", pymongo.ASCENDING)], sparse=True)
+
+    async def find_by_user_id(self, user_id: str) -> Optional[dict]:
+        return await self.collection.find_one({"userId": user_id})
+
+    async def find_by_credentials(self, username: str, hashed_password: str) -> Optional[dict]:
+        return await self.collection.find_one({"username": username, "password": hashed_password})
+
+    async def find_by_api_key(self, api_key: str) -> Optional[dict]:
+        return await self.collection.find_one({"apiKey": api_key})
+
+    async def iter_api_keys(self):
+        async for user in self.collection.find({"apiKey": {"$exists": True}}, {"apiKey": 1, "_id": 0}):
+            yield user["apiKey"]
+
+    async def upsert_user(self, user_id: str, fields: dict):
+        await self.collection.update_one({"userId": user_id}, {"$set": fields}, upsert=True)
+
+    async def revoke_tokens(self, user_id: str):
+        await self.collection.update_one({"userId": user_id}, {"$inc": {"tokenVersion": 1}})
+
+    async def set_api_key(self, user_id: str, api_key: str):
+        await self.collection.update_one({"userId": user_id}, {"$set": {"apiKey": api_key}})
@@ -0,0 +1,122 @@
+import hashlib
+import struct
+import time
+from typing import List, Optional, Tuple
+
+from fastapi import Response
+
+from BroomStick.utils.ConditionalRequest import NOT_MODIFIED_HEADERS, is_not_modified
+
+# rough per entry bookkeeping cost so tiny bodies still count against the budget
+ENTRY_OVERHEAD = 256
+
+# status, created at, expires at, stale until, header count, body length
+SERIALIZED_HEADER = struct.Struct("<HdddII")
+SERIALIZED_FIELD = struct.Struct("<HH")
+MAX_FIELD_LENGTH = 0xFFFF
+
+# directives that keep a response out of any cache shared between clients
+UNCACHEABLE_DIRECTIVES = {"private", "no-store"}
+
+
+def is_storable(headers: List[Tuple[bytes, bytes]]) -> bool:
+    # cookies belong to the client that got them, they must never be replayed to others
+    for key, value in headers:
+        if key == b"set-cookie":
+            return False
+        if key == b"cache-control":
+            directives = {directive.strip().partition("=")[0].lower() for directive in value.decode("latin-1").split(",")}
+            if directives & UNCACHEABLE_DIRECTIVES:
+                return False
+    return True
+
+
+class CachedResponse:
+    __slots__ = ("status_code", "headers", "body", "created_at", "expires_at", "stale_until", "size", "etag", "upstream_etag", "last_modified")
+
+    def __init__(self, status_code: int, headers: List[Tuple[bytes, bytes]], body: bytes, ttl: float, stale_ttl: float = 0):
+        self.status_code = status_code
+        self.headers = tuple(headers)
+        self.body = bytes(body)
+        self.created_at = time.time()
+        self.expires_at = self.created_at + ttl
+        self.stale_until = self.expires_at + stale_ttl
+        self.size = len(self.body) + sum(len(key) + len(value) for key, value in self.headers) + ENTRY_OVERHEAD
+
+        # responses without a validator of their own get one from their content
+        etag = self.get_header(b"etag")
+        self.upstream_etag = etag is not None
+        if etag is None:
+            etag = '"' + hashlib.sha1(self.body).hexdigest() + '"'
+        self.etag: str = etag
+        self.last_modified: Optional[str] = self.get_header(b"last-modified")
+
+    def get_header(self, name: bytes) -> Optional[str]:
+        for key, value in self.headers:
+            if key == name:
+                return value.decode("latin-1")
+        return None
+
+    def is_expired(self, now: float = None) -> bool:
+        if now is None:
+            now = time.time()
+        return now >= self.expires_at
+
+    def is_stale_usable(self, now: float = None) -> bool:
+        if now is None:
+            now = time.time()
+        return now < self.stale_until
+
+    def to_bytes(self) -> Optional[bytes]:
+        # None when a header is too long for the format, the entry then only lives in this worker's memory
+        parts = [SERIALIZED_HEADER.pack(self.status_code, self.created_at, self.expires_at, self.stale_until, len(self.headers), len(self.body))]
+        for key, value in self.headers:
+            if len(key) > MAX_FIELD_LENGTH or len(value) > MAX_FIELD_LENGTH:
+                return None
+            parts.append(SERIALIZED_FIELD.pack(len(key), len(value)))
+            parts.append(key)
+            parts.append(value)
+        parts.append(self.body)
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "CachedResponse":
+        status_code, created_at, expires_at, stale_until, header_count, body_length = SERIALIZED_HEADER.unpack_from(data, 0)
+        offset = SERIALIZED_HEADER.size
+        headers = []
+        for _ in range(header_count):
+            key_length, value_length = SERIALIZED_FIELD.unpack_from(data, offset)
+            offset += SERIALIZED_FIELD.size
+            key = data[offset:offset + key_length]
+            offset += key_length
+            headers.append((key, data[offset:offset + value_length]))
+            offset += value_length
+        entry = cls(status_code, headers, data[offset:offset + body_length], 0)
+        entry.created_at = created_at
+        entry.expires_at = expires_at
+        entry.stale_until = stale_until
+        return entry
+
+    def is_not_modified(self, if_none_match: Optional[str], if_modified_since: Optional[str]) -> bool:
+        return is_not_modified(if_none_match, if_modified_since, self.etag, self.last_modified)
+
+    def revalidated(self, headers: List[Tuple[bytes, bytes]], ttl: float, stale_ttl: float = 0) -> "CachedResponse":
+        # a 304 from upstream renews the entry, headers it sent replace the stored ones
+        updated = {key for key, _ in headers if key in NOT_MODIFIED_HEADERS}
+        merged = [(key, value) for key, value in self.headers if key not in updated]
+        merged.extend((key, value) for key, value in headers if key in updated)
+        return CachedResponse(self.status_code, merged, self.body, ttl, stale_ttl)
+
+    def to_response(self) -> Response:
+        response = Response(content=self.body, status_code=self.status_code)
+        response.raw_headers = list(self.headers)
+        if not self.upstream_etag:
+            response.raw_headers.append((b"etag", self.etag.encode("latin-1")))
+        return response
+
+    def to_not_modified_response(self) -> Response:
+        response = Response(status_code=304)
+        response.raw_headers = [(key, value) for key, value in self.headers if key in NOT_MODIFIED_HEADERS]
+        if not self.upstream_etag:
+            response.raw_headers.append((b"etag", self.etag.encode("latin-1")))
+        return response
@@ -0,0 +1,84 @@
+import asyncio
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+
+from BroomStick.Cache.CachedResponse import CachedResponse
+
+
+class ResponseCache:
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.entries: OrderedDict = OrderedDict()
+        # key -> future resolved with the entry the leading request fetched
+        self.in_flight: Dict[Hashable, asyncio.Future] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.not_modified = 0
+        self.revalidated = 0
+
+    def get(self, key: Hashable, allow_stale=False) -> Optional[CachedResponse]:
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry.is_expired():
+            if not entry.is_stale_usable():
+                self.remove(key)
+                self.misses += 1
+                return None
+            if not allow_stale:
+                self.misses += 1
+                return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def peek(self, key: Hashable) -> Optional[CachedResponse]:
+        # the entry regardless of its age, its validators can still revalidate it upstream
+        return self.entries.get(key)
+
+    def put(self, key: Hashable, entry: CachedResponse) -> bool:
+        self.remove(key)
+        # a single entry may never push everything else out of the cache
+        if entry.size > self.max_bytes // 4:
+            return False
+        self.entries[key] = entry
+        self.current_bytes += entry.size
+        while self.current_bytes > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.current_bytes -= evicted.size
+            self.evictions += 1
+        return True
+
+    def remove(self, key: Hashable):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.current_bytes -= entry.size
+
+    def begin_flight(self, key: Hashable) -> Optional[asyncio.Future]:
+        # returns a future when the caller became the leader for this key, None if a fetch is already running
+        if key in self.in_flight:
+            return None
+        future = asyncio.get_event_loop().create_future()
+        self.in_flight[key] = future
+        return future
+
+    def get_flight(self, key: Hashable) -> Optional[asyncio.Future]:
+        return self.in_flight.get(key)
+
+    def end_flight(self, key: Hashable, future: asyncio.Future, entry: Optional[CachedResponse]):
+        if self.in_flight.get(key) is future:
+            del self.in_flight[key]
+        if not future.done():
+            future.set_result(entry)
+
+    def clear(self):
+        self.entries.clear()
+        self.current_bytes = 0
+
+    def __len__(self):
+        return len(self.entries)
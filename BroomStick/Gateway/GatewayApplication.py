@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import re
+import time
+import traceback
+from typing import TYPE_CHECKING, List, Optional, Pattern, Set
+
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from starlette.middleware.cors import CORSMiddleware
+from starlette.types import Receive, Scope, Send
+
+from BroomStick.Admission.ConcurrencyLimiter import ConcurrencyLimiter
+from BroomStick.data_class.APIResponse import APIResponse, CommonAPIResponse
+from BroomStick.data_class.RequestContext import RequestContext
+
+if TYPE_CHECKING:
+    from BroomStick import BroomStick
+
+
+# the methods the FastAPI catch-all route used to register, anything else is answered like it did
+PROXIED_METHODS = ("GET", "PUT", "POST", "DELETE", "PATCH", "HEAD", "OPTIONS")
+
+
+class GatewayApplication:
+
+    # entry point ASGI app, proxied traffic is handled on the raw scope and only the
+    # gateway's own endpoints (/register, /authenticate, /metrics, ...) go through FastAPI
+    def __init__(self, main: BroomStick):
+        self.main: BroomStick = main
+        self.proxy = CORSMiddleware(self.handle_proxy, **self.main.get_cors_options())
+        self.control_paths: Optional[Set[str]] = None
+        self.control_patterns: List[Pattern] = []
+        self.admission: Optional[ConcurrencyLimiter] = None
+        if "admission" in self.main.config:
+            self.admission = ConcurrencyLimiter(self.main.config["admission"])
+
+    def load_control_paths(self):
+        self.control_paths = set()
+        for route in self.main.app.routes:
+            path = getattr(route, "path", None)
+            if path is None:
+                continue
+            if "{" in path:
+                self.control_patterns.append(getattr(route, "path_regex", re.compile("^" + re.escape(path) + "$")))
+            else:
+                self.control_paths.add(path)
+
+    def is_control_path(self, path: str) -> bool:
+        if self.control_paths is None:
+            self.load_control_paths()
+        if path in self.control_paths:
+            return True
+        for pattern in self.control_patterns:
+            if pattern.match(path):
+                return True
+        return False
+
+    def get_shadowed_routes(self, routes) -> List[str]:
+        # control paths are answered before route matching, a proxied route never sees requests for them
+        if self.control_paths is None:
+            self.load_control_paths()
+        shadowed = []
+        for path in sorted(self.control_paths):
+            for route in routes:
+                if route.route_info_function.matches_path(path):
+                    shadowed.append(path + " shadows route " + route.route_info_function.get_path())
+        return shadowed
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or self.is_control_path(scope["path"]):
+            await self.main.app(scope, receive, send)
+            return
+        await self.proxy(scope, receive, send)
+
+    async def handle_proxy(self, scope: Scope, receive: Receive, send: Send):
+        if scope["method"] not in PROXIED_METHODS:
+            response = JSONResponse({"detail": "Method Not Allowed"}, status_code=405, headers={"Allow": ", ".join(PROXIED_METHODS)})
+            await response(scope, receive, send)
+            return
+        # gateway wide admission, overload is answered before any work is done for the request.
+        # clients are told to back off the same way the route rate limiter does
+        if self.admission is not None:
+            if not await self.admission.acquire():
+                self.main.metrics.shed_requests.inc(("gateway",))
+                response = CommonAPIResponse.RateLimited
+                await JSONResponse(response.get_response_object(), status_code=response.code)(scope, receive, send)
+                return
+            started = time.perf_counter()
+            try:
+                await self.handle_request(scope, receive, send)
+            finally:
+                self.admission.release(time.perf_counter() - started)
+            return
+        await self.handle_request(scope, receive, send)
+
+    async def handle_request(self, scope: Scope, receive: Receive, send: Send):
+        request = Request(scope, receive)
+        context = RequestContext(self.main, request)
+        self.main.metrics.on_request_start()
+        status_code = 500
+        sent = [0]
+        if self.main.access_log.is_enabled():
+            send = self.count_body(send, sent)
+        try:
+            try:
+                res = await self.main.process_request(request, request.method, context)
+            except Exception:
+                traceback.print_exc()
+                res = CommonAPIResponse.InternalError
+            if isinstance(res, APIResponse):
+                res = JSONResponse(res.get_response_object(), status_code=res.code)
+            status_code = res.status_code
+            await res(scope, receive, send)
+        finally:
+            context.finish()
+            self.main.metrics.on_request_end(context, status_code)
+            self.main.access_log.log(context, status_code, sent[0])
+
+    @staticmethod
+    def count_body(send: Send, sent: list) -> Send:
+        # streamed responses have no length up front, the bytes are counted as they go out
+        async def counting_send(message):
+            if message["type"] == "http.response.body":
+                sent[0] += len(message.get("body", b""))
+            await send(message)
+        return counting_send
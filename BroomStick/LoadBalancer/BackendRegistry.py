@@ -0,0 +1,35 @@
+from typing import Dict, Optional
+
+from BroomStick.Admission.ConcurrencyLimiter import ConcurrencyLimiter
+from BroomStick.LoadBalancer.BackendState import BackendState
+
+
+class BackendRegistry:
+
+    # backends are shared between routes, so load from every route counts against the same state
+    def __init__(self, config: dict = None, concurrency_config: dict = None):
+        self.config = config if config is not None else {}
+        self.concurrency_config = concurrency_config if concurrency_config is not None else {}
+        self.backends: Dict[str, BackendState] = {}
+
+    def get_concurrency_config(self, url: str) -> Optional[dict]:
+        # backendConcurrency holds the defaults for every backend, overrides are keyed by backend url
+        override = self.concurrency_config.get("overrides", {}).get(url)
+        if override is None and "limit" not in self.concurrency_config:
+            return None
+        config = {key: value for key, value in self.concurrency_config.items() if key != "overrides"}
+        if override is not None:
+            config.update(override)
+        return config
+
+    def get(self, url: str) -> BackendState:
+        backend = self.backends.get(url)
+        if backend is None:
+            concurrency_config = self.get_concurrency_config(url)
+            limiter = ConcurrencyLimiter(concurrency_config) if concurrency_config is not None else None
+            backend = BackendState(url, self.config, limiter)
+            self.backends[url] = backend
+        return backend
+
+    def __iter__(self):
+        return iter(self.backends.values())
@@ -0,0 +1,142 @@
+import math
+import time
+from collections import deque
+
+from BroomStick.Admission.ConcurrencyLimiter import ConcurrencyLimiter
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "halfOpen"
+
+
+class BackendState:
+
+    def __init__(self, url: str, config: dict = None, limiter: ConcurrencyLimiter = None):
+        self.url = url
+        self.config = config if config is not None else {}
+        self.limiter = limiter
+        self.outstanding = 0
+        self.total_requests = 0
+        self.total_errors = 0
+
+        # peak EWMA of the upstream latency in seconds
+        self.ewma_latency = 0.0
+        self.last_update = time.monotonic()
+
+        # passive health, recent outcomes where True means the request failed
+        self.recent_failures = deque(maxlen=self.config.get("windowSize", 20))
+        self.recent_failure_count = 0
+        self.consecutive_failures = 0
+
+        # circuit breaker
+        self.circuit = CLOSED
+        self.open_until = 0.0
+        self.ejection_count = 0
+        self.trial_in_flight = False
+        self.trial_started = 0.0
+
+    def on_start(self):
+        self.outstanding += 1
+        self.total_requests += 1
+
+    def on_finish(self, latency: float, error: bool = False, decay_time: float = 10.0):
+        self.outstanding = max(0, self.outstanding - 1)
+
+        now = time.monotonic()
+        if latency > self.ewma_latency:
+            self.ewma_latency = latency
+        else:
+            weight = math.exp(-(now - self.last_update) / decay_time)
+            self.ewma_latency = self.ewma_latency * weight + latency * (1 - weight)
+        self.last_update = now
+
+        slow_threshold = self.config.get("slowRequestThreshold")
+        if slow_threshold is not None and latency > slow_threshold:
+            error = True
+        self.record_outcome(error)
+
+    def on_cancel(self):
+        # abandoned attempts (a hedge that lost the race) say nothing about the backend's health
+        self.outstanding = max(0, self.outstanding - 1)
+        if self.circuit == HALF_OPEN:
+            self.trial_in_flight = False
+
+    def record_outcome(self, failed: bool):
+        if failed:
+            self.total_errors += 1
+        if len(self.recent_failures) == self.recent_failures.maxlen and self.recent_failures[0]:
+            self.recent_failure_count -= 1
+        self.recent_failures.append(failed)
+        if failed:
+            self.recent_failure_count += 1
+            self.consecutive_failures += 1
+        else:
+            self.consecutive_failures = 0
+
+        if self.circuit == HALF_OPEN:
+            self.trial_in_flight = False
+            if failed:
+                self.eject()
+            else:
+                self.close()
+            return
+
+        if self.circuit == CLOSED and failed and self.should_eject():
+            self.eject()
+
+    def should_eject(self) -> bool:
+        if self.consecutive_failures >= self.config.get("consecutiveFailures", 5):
+            return True
+        if len(self.recent_failures) < self.config.get("minRequests", 10):
+            return False
+        return self.recent_failure_count / len(self.recent_failures) >= self.config.get("errorRateThreshold", 0.5)
+
+    def eject(self):
+        # every ejection in a row doubles the time the backend stays out, up to a limit
+        ejection_time = self.config.get("ejectionTime", 30) * (2 ** self.ejection_count)
+        ejection_time = min(ejection_time, self.config.get("maxEjectionTime", 300))
+        self.circuit = OPEN
+        self.open_until = time.monotonic() + ejection_time
+        self.ejection_count += 1
+        self.trial_in_flight = False
+
+    def close(self):
+        self.circuit = CLOSED
+        self.ejection_count = 0
+        self.consecutive_failures = 0
+        self.recent_failures.clear()
+        self.recent_failure_count = 0
+
+    def on_probe(self, healthy: bool):
+        if healthy:
+            if self.circuit != CLOSED:
+                self.close()
+        elif self.circuit == CLOSED or time.monotonic() >= self.open_until:
+            self.eject()
+
+    def is_available(self) -> bool:
+        if self.circuit == CLOSED:
+            return True
+        if self.circuit == OPEN:
+            if time.monotonic() < self.open_until:
+                return False
+            self.circuit = HALF_OPEN
+        # half open lets a single trial request through, a lost trial is given up after a while
+        return not self.trial_in_flight or time.monotonic() - self.trial_started >= self.config.get("trialTimeout", 30)
+
+    def acquire(self) -> bool:
+        # claims the half open trial once the backend was actually picked for a request
+        if not self.is_available():
+            return False
+        if self.circuit == HALF_OPEN:
+            self.trial_in_flight = True
+            self.trial_started = time.monotonic()
+        return True
+
+    def release_trial(self):
+        # the request never reached the backend, the next one may take the trial
+        if self.circuit == HALF_OPEN:
+            self.trial_in_flight = False
+
+    def get_cost(self) -> float:
+        return self.ewma_latency * (self.outstanding + 1)
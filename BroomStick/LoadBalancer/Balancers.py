@@ -0,0 +1,25 @@
+from typing import List
+
+from BroomStick.LoadBalancer.BackendState import BackendState
+from BroomStick.LoadBalancer.ConsistentHashBalancer import ConsistentHashBalancer
+from BroomStick.LoadBalancer.LeastOutstandingBalancer import LeastOutstandingBalancer
+from BroomStick.LoadBalancer.LoadBalancer import LoadBalancer
+from BroomStick.LoadBalancer.PeakEwmaBalancer import PeakEwmaBalancer
+from BroomStick.LoadBalancer.RandomBalancer import RandomBalancer
+from BroomStick.LoadBalancer.RoundRobinBalancer import RoundRobinBalancer
+from BroomStick.LoadBalancer.WeightedRoundRobinBalancer import WeightedRoundRobinBalancer
+
+BALANCERS = {
+    "random": RandomBalancer,
+    "roundRobin": RoundRobinBalancer,
+    "weightedRoundRobin": WeightedRoundRobinBalancer,
+    "leastOutstanding": LeastOutstandingBalancer,
+    "peakEwma": PeakEwmaBalancer,
+    "consistentHash": ConsistentHashBalancer,
+}
+
+
+def create_balancer(balancer_type: str, backends: List[BackendState], weights: List[int], config: dict) -> LoadBalancer:
+    if balancer_type not in BALANCERS:
+        raise ValueError("Unknown balancer " + str(balancer_type))
+    return BALANCERS[balancer_type](backends, weights, config)
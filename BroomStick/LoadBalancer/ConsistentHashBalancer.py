@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import bisect
+import hashlib
+from typing import TYPE_CHECKING
+
+from BroomStick.LoadBalancer.BackendState import BackendState
+from BroomStick.LoadBalancer.LoadBalancer import LoadBalancer
+from BroomStick.data_class.RouteIndex import clean_path
+
+if TYPE_CHECKING:
+    from BroomStick.data_class.RequestContext import RequestContext
+
+
+def hash_key(value: str) -> int:
+    # stable across processes, unlike hash()
+    return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+
+class ConsistentHashBalancer(LoadBalancer):
+
+    def __init__(self, backends, weights, config):
+        super().__init__(backends, weights, config)
+        replicas = config.get("replicas", 100)
+        ring = []
+        for backend, weight in zip(backends, weights):
+            for i in range(replicas * weight):
+                ring.append((hash_key(backend.url + "#" + str(i)), backend))
+        ring.sort(key=lambda x: x[0])
+        self.ring_hashes = [point for point, _ in ring]
+        self.ring_backends = [backend for _, backend in ring]
+
+    def get_hash_source(self, context: RequestContext) -> str:
+        if self.config.get("hashOn", "path") == "user":
+            user = context.get_user()
+            if user is not None:
+                return user.user_id
+            if context.request.client is not None:
+                return context.request.client.host
+        return clean_path(context.request.url.path)
+
+    def pick(self, context: RequestContext) -> BackendState:
+        position = bisect.bisect(self.ring_hashes, hash_key(self.get_hash_source(context)))
+        if position == len(self.ring_hashes):
+            position = 0
+        return self.ring_backends[position]
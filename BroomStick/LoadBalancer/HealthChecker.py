@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import asyncio
+from typing import TYPE_CHECKING, Dict, Tuple
+
+import httpx
+
+if TYPE_CHECKING:
+    from BroomStick import BroomStick
+
+
+class HealthChecker:
+
+    def __init__(self, main: BroomStick):
+        self.main: BroomStick = main
+        self.tasks: Dict[Tuple[str, str], asyncio.Task] = {}
+        self.running = False
+
+    def get_targets(self) -> Dict[Tuple[str, str], dict]:
+        # (backend url, probe path) -> probe config, a backend shared by routes is probed once
+        targets = {}
+        for route in self.main.routes:
+            config = route.route_info_function.get_health_check_config()
+            if config is None or config.get("path") is None:
+                continue
+            for url in route.route_info_function.get_backends():
+                targets.setdefault((url, config["path"]), config)
+        return targets
+
+    def start(self):
+        self.running = True
+        self.sync()
+
+    def sync(self):
+        # called again whenever the route table changes, probes of unchanged targets keep running
+        if not self.running:
+            return
+        targets = self.get_targets()
+        for target in list(self.tasks):
+            if target not in targets:
+                self.tasks.pop(target).cancel()
+        for (url, path), config in targets.items():
+            if (url, path) not in self.tasks:
+                self.tasks[(url, path)] = asyncio.ensure_future(self.probe_loop(url, path, config))
+
+    async def stop(self):
+        self.running = False
+        tasks = list(self.tasks.values())
+        self.tasks = {}
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    async def probe_loop(self, url: str, path: str, config: dict):
+        backend = self.main.backend_registry.get(url)
+        while True:
+            backend.on_probe(await self.probe(url + path, config.get("timeout", 2)))
+            await asyncio.sleep(config.get("interval", 10))
+
+    async def probe(self, url: str, timeout: float) -> bool:
+        try:
+            client = self.main.upstream.get_client(url)
+            response = await client.get(url, timeout=timeout)
+            return 200 <= response.status_code < 400
+        except httpx.HTTPError:
+            return False
@@ -0,0 +1,23 @@
+from __future__ import annotations
+
+import random
+from typing import TYPE_CHECKING
+
+from BroomStick.LoadBalancer.BackendState import BackendState
+from BroomStick.LoadBalancer.LoadBalancer import LoadBalancer
+
+if TYPE_CHECKING:
+    from BroomStick.data_class.RequestContext import RequestContext
+
+
+class LeastOutstandingBalancer(LoadBalancer):
+
+    # power of two choices, close to a full scan in quality but constant time
+    def pick(self, context: RequestContext) -> BackendState:
+        if len(self.backends) == 1:
+            return self.backends[0]
+        first, second = random.sample(self.backends, 2)
+        # compare outstanding / weight without dividing
+        if second.outstanding * self.weight_by_url[first.url] < first.outstanding * self.weight_by_url[second.url]:
+            return second
+        return first
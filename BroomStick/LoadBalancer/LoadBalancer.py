@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, List, Optional
+
+from BroomStick.LoadBalancer.BackendState import BackendState
+
+if TYPE_CHECKING:
+    from BroomStick.data_class.RequestContext import RequestContext
+
+
+class LoadBalancer:
+
+    def __init__(self, backends: List[BackendState], weights: List[int], config: dict):
+        self.backends = backends
+        self.weights = weights
+        self.config = config
+        self.weight_by_url = {backend.url: weight for backend, weight in zip(backends, weights)}
+        self.fallback_offset = 0
+
+    def pick(self, context: RequestContext) -> BackendState:
+        raise NotImplementedError
+
+    def select(self, context: RequestContext, exclude=()) -> Optional[BackendState]:
+        # the strategy's own pick is used whenever it is healthy, ejected backends are skipped
+        # and retries pass the backends they already tried as exclude
+        backend = self.pick(context)
+        if backend not in exclude and backend.acquire():
+            return backend
+        # the fallback rotates over the healthy backends so the load does not pile onto the first one
+        candidates = [backend for backend in self.backends if backend not in exclude and backend.is_available()]
+        if len(candidates) == 0:
+            return None
+        self.fallback_offset += 1
+        backend = candidates[self.fallback_offset % len(candidates)]
+        backend.acquire()
+        return backend
@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+import random
+from typing import TYPE_CHECKING
+
+from BroomStick.LoadBalancer.BackendState import BackendState
+from BroomStick.LoadBalancer.LoadBalancer import LoadBalancer
+
+if TYPE_CHECKING:
+    from BroomStick.data_class.RequestContext import RequestContext
+
+
+class PeakEwmaBalancer(LoadBalancer):
+
+    def pick(self, context: RequestContext) -> BackendState:
+        if len(self.backends) == 1:
+            return self.backends[0]
+        first, second = random.sample(self.backends, 2)
+        if second.get_cost() / self.weight_by_url[second.url] < first.get_cost() / self.weight_by_url[first.url]:
+            return second
+        return first
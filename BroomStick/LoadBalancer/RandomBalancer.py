@@ -0,0 +1,16 @@
+from __future__ import annotations
+
+import random
+from typing import TYPE_CHECKING
+
+from BroomStick.LoadBalancer.BackendState import BackendState
+from BroomStick.LoadBalancer.LoadBalancer import LoadBalancer
+
+if TYPE_CHECKING:
+    from BroomStick.data_class.RequestContext import RequestContext
+
+
+class RandomBalancer(LoadBalancer):
+
+    def pick(self, context: RequestContext) -> BackendState:
+        return random.choice(self.backends)
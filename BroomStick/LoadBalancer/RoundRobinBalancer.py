@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from BroomStick.LoadBalancer.BackendState import BackendState
+from BroomStick.LoadBalancer.LoadBalancer import LoadBalancer
+
+if TYPE_CHECKING:
+    from BroomStick.data_class.RequestContext import RequestContext
+
+
+class RoundRobinBalancer(LoadBalancer):
+
+    def __init__(self, backends, weights, config):
+        super().__init__(backends, weights, config)
+        self.position = 0
+
+    def pick(self, context: RequestContext) -> BackendState:
+        backend = self.backends[self.position % len(self.backends)]
+        self.position += 1
+        return backend
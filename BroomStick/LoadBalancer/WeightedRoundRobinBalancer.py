@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+import math
+from functools import reduce
+from typing import TYPE_CHECKING, List
+
+from BroomStick.LoadBalancer.BackendState import BackendState
+from BroomStick.LoadBalancer.LoadBalancer import LoadBalancer
+
+if TYPE_CHECKING:
+    from BroomStick.data_class.RequestContext import RequestContext
+
+
+class WeightedRoundRobinBalancer(LoadBalancer):
+
+    def __init__(self, backends, weights, config):
+        super().__init__(backends, weights, config)
+        self.schedule = self.build_schedule()
+        self.position = 0
+
+    def build_schedule(self) -> List[BackendState]:
+        # one full cycle of smooth weighted round robin, computed once so a pick is a list lookup
+        divisor = reduce(math.gcd, self.weights)
+        weights = [weight // divisor for weight in self.weights]
+        total = sum(weights)
+        current = [0] * len(weights)
+        schedule = []
+        for _ in range(total):
+            for i, weight in enumerate(weights):
+                current[i] += weight
+            best = max(range(len(weights)), key=lambda i: current[i])
+            current[best] -= total
+            schedule.append(self.backends[best])
+        return schedule
+
+    def pick(self, context: RequestContext) -> BackendState:
+        backend = self.schedule[self.position % len(self.schedule)]
+        self.position += 1
+        return backend
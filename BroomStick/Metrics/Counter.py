@@ -0,0 +1,21 @@
+from typing import Dict, List
+
+from BroomStick.Metrics.Metric import Metric
+
+
+class Counter(Metric):
+    metric_type = "counter"
+
+    def __init__(self, name, documentation, label_names=()):
+        super().__init__(name, documentation, label_names)
+        self.values: Dict[tuple, float] = {}
+
+    def inc(self, labels: tuple = (), amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def set(self, labels: tuple, value: float):
+        # mirrors a total that is already counted elsewhere, e.g. a cache's own hit counter
+        self.values[labels] = value
+
+    def render_samples(self) -> List[str]:
+        return [self.name + self.format_labels(labels) + " " + repr(float(value)) for labels, value in self.values.items()]
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from BroomStick.Metrics.MetricsRegistry import MetricsRegistry
+
+if TYPE_CHECKING:
+    from BroomStick import BroomStick
+    from BroomStick.data_class.RequestContext import RequestContext
+
+
+class GatewayMetrics:
+
+    def __init__(self, main: BroomStick):
+        self.main: BroomStick = main
+        self.registry = MetricsRegistry()
+        registry = self.registry
+
+        self.requests = registry.counter("broomstick_requests_total", "Proxied requests by route, status and backend.", ("route", "status", "backend"))
+        self.request_duration = registry.histogram("broomstick_request_duration_seconds", "Total time spent in process_request.", ("route",))
+        self.stage_duration = registry.histogram("broomstick_stage_duration_seconds", "Time spent in each pipeline stage.", ("route", "stage"))
+        self.in_flight = registry.gauge("broomstick_requests_in_flight", "Requests currently being processed.")
+
+        self.backend_outstanding = registry.gauge("broomstick_backend_outstanding_requests", "Requests currently waiting on a backend.", ("backend",))
+        self.backend_available = registry.gauge("broomstick_backend_available", "1 if the backend accepts traffic, 0 while it is ejected.", ("backend",))
+        self.shed_requests = registry.counter("broomstick_shed_requests_total", "Requests rejected by admission control, by where the limit was hit.", ("scope",))
+        self.upstream_retries = registry.counter("broomstick_upstream_retries_total", "Extra upstream attempts by route and kind (retry or hedge).", ("route", "kind"))
+
+        self.auth_cache = registry.counter("broomstick_auth_cache_requests_total", "Authenticator cache lookups.", ("cache", "result"))
+        self.response_cache = registry.counter("broomstick_response_cache_requests_total", "Response cache lookups.", ("result",))
+        self.response_cache_evictions = registry.counter("broomstick_response_cache_evictions_total", "Entries evicted from the response cache.")
+        self.response_cache_bytes = registry.gauge("broomstick_response_cache_bytes", "Bytes held by the response cache.")
+        self.response_cache_entries = registry.gauge("broomstick_response_cache_entries", "Entries held by the response cache.")
+        self.access_log_entries = registry.counter("broomstick_access_log_entries_total", "Access log entries by outcome (written, dropped or failed).", ("result",))
+
+        registry.add_collector(self.collect)
+
+    def get_config(self):
+        return self.main.config.get("metrics", {})
+
+    def is_enabled(self):
+        # off by default, the endpoint lists backend urls and route internals
+        return self.get_config().get("enabled", False)
+
+    def requires_authorization(self):
+        return self.get_config().get("requireAuthorization", True)
+
+    def get_path(self):
+        return self.get_config().get("path", "/metrics")
+
+    def on_request_start(self):
+        self.in_flight.inc()
+
+    def on_request_end(self, context: RequestContext, status_code: int):
+        self.in_flight.dec()
+        route = "none"
+        if context.route is not None:
+            route = context.route.route_info_function.get_path()
+        self.requests.inc((route, str(status_code), context.backend or ""))
+        self.request_duration.observe(context.get_elapsed(), (route,))
+        for stage, seconds in context.timings.items():
+            self.stage_duration.observe(seconds, (route, stage))
+
+    def collect(self):
+        token_cache = self.main.authenticator.token_user_id_cache
+        self.auth_cache.set(("token_user_id_cache", "hit"), token_cache.hits)
+        self.auth_cache.set(("token_user_id_cache", "miss"), token_cache.misses)
+        for name in ("cached_users", "api_key_user_id_cache"):
+            cache = getattr(self.main.authenticator, name)
+            self.auth_cache.set((name, "hit"), cache.hits)
+            self.auth_cache.set((name, "miss"), cache.misses)
+            self.auth_cache.set((name, "refresh"), cache.refreshes)
+        unknown_api_keys = self.main.authenticator.unknown_api_keys
+        self.auth_cache.set(("unknown_api_key_cache", "hit"), unknown_api_keys.hits)
+        self.auth_cache.set(("unknown_api_key_cache", "miss"), unknown_api_keys.misses)
+
+        response_cache = self.main.response_cache
+        self.response_cache.set(("hit",), response_cache.hits)
+        self.response_cache.set(("miss",), response_cache.misses)
+        self.response_cache.set(("not_modified",), response_cache.not_modified)
+        self.response_cache.set(("revalidated",), response_cache.revalidated)
+        self.response_cache_evictions.set((), response_cache.evictions)
+        self.response_cache_bytes.set((), response_cache.current_bytes)
+        self.response_cache_entries.set((), len(response_cache))
+
+        access_log = self.main.access_log
+        self.access_log_entries.set(("written",), access_log.written)
+        self.access_log_entries.set(("dropped",), access_log.dropped)
+        self.access_log_entries.set(("failed",), access_log.failed)
+
+        for backend in self.main.backend_registry:
+            self.backend_outstanding.set((backend.url,), backend.outstanding)
+            self.backend_available.set((backend.url,), 1 if backend.circuit == "closed" else 0)
+
+    def render(self) -> str:
+        return self.registry.render()
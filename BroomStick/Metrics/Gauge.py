@@ -0,0 +1,23 @@
+from typing import Dict, List
+
+from BroomStick.Metrics.Metric import Metric
+
+
+class Gauge(Metric):
+    metric_type = "gauge"
+
+    def __init__(self, name, documentation, label_names=()):
+        super().__init__(name, documentation, label_names)
+        self.values: Dict[tuple, float] = {}
+
+    def set(self, labels: tuple, value: float):
+        self.values[labels] = value
+
+    def inc(self, labels: tuple = (), amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def dec(self, labels: tuple = (), amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) - amount
+
+    def render_samples(self) -> List[str]:
+        return [self.name + self.format_labels(labels) + " " + repr(float(value)) for labels, value in self.values.items()]
@@ -0,0 +1,36 @@
+from bisect import bisect_left
+from typing import Dict, List
+
+from BroomStick.Metrics.Metric import Metric
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram(Metric):
+    metric_type = "histogram"
+
+    def __init__(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(buckets)
+        # labels -> [per bucket counts (last one is +Inf), sum]
+        self.values: Dict[tuple, list] = {}
+
+    def observe(self, value: float, labels: tuple = ()):
+        state = self.values.get(labels)
+        if state is None:
+            state = [[0] * (len(self.buckets) + 1), 0.0]
+            self.values[labels] = state
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1] += value
+
+    def render_samples(self) -> List[str]:
+        lines = []
+        for labels, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(self.name + "_bucket" + self.format_labels(labels, (("le", le),)) + " " + str(cumulative))
+            lines.append(self.name + "_sum" + self.format_labels(labels) + " " + repr(total))
+            lines.append(self.name + "_count" + self.format_labels(labels) + " " + str(cumulative))
+        return lines
@@ -0,0 +1,31 @@
+from typing import List, Tuple
+
+
+def escape_label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace("\"", "\\\"")
+
+
+class Metric:
+    metric_type = "untyped"
+
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+
+    def format_labels(self, labels: tuple, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+        pairs = list(zip(self.label_names, labels)) + list(extra)
+        if len(pairs) == 0:
+            return ""
+        return "{" + ",".join(key + "=\"" + escape_label_value(value) + "\"" for key, value in pairs) + "}"
+
+    def render_samples(self) -> List[str]:
+        return []
+
+    def render(self) -> List[str]:
+        lines = [
+            "# HELP " + self.name + " " + self.documentation,
+            "# TYPE " + self.name + " " + self.metric_type
+        ]
+        lines.extend(self.render_samples())
+        return lines
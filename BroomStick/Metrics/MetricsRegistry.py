@@ -0,0 +1,38 @@
+from typing import Callable, List
+
+from BroomStick.Metrics.Counter import Counter
+from BroomStick.Metrics.Gauge import Gauge
+from BroomStick.Metrics.Histogram import DEFAULT_BUCKETS, Histogram
+from BroomStick.Metrics.Metric import Metric
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self.metrics: List[Metric] = []
+        # run right before rendering to copy state that is tracked elsewhere into metrics
+        self.collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: Metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, label_names=()) -> Counter:
+        return self.register(Counter(name, documentation, label_names))
+
+    def gauge(self, name: str, documentation: str, label_names=()) -> Gauge:
+        return self.register(Gauge(name, documentation, label_names))
+
+    def histogram(self, name: str, documentation: str, label_names=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, label_names, buckets))
+
+    def add_collector(self, collector: Callable[[], None]):
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self.collectors:
+            collector()
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,81 @@
+import time
+from array import array
+from collections import OrderedDict
+
+TOKEN_BUCKET = "tokenBucket"
+SLIDING_WINDOW = "slidingWindow"
+
+# doubles kept per key, token bucket: (tokens, last refill), sliding window: (window start, previous, current)
+SLOT_SIZE = 3
+
+
+class LocalRateLimiter:
+
+    def __init__(self, limit: float, period: float, algorithm: str = TOKEN_BUCKET, burst: float = None, max_keys: int = 100000):
+        if algorithm not in (TOKEN_BUCKET, SLIDING_WINDOW):
+            raise ValueError("Unknown rate limit algorithm " + str(algorithm))
+        self.limit = limit
+        self.period = period
+        self.algorithm = algorithm
+        self.capacity = burst if burst is not None else limit
+        self.rate = limit / period
+        self.max_keys = max_keys
+
+        # all state lives in one preallocated buffer, keys only map to a slot in it
+        self.state = array("d", bytes(8 * SLOT_SIZE * max_keys))
+        self.slots: OrderedDict = OrderedDict()
+        self.next_free_slot = 0
+
+    def get_slot(self, key, now: float) -> int:
+        slot = self.slots.get(key)
+        if slot is not None:
+            self.slots.move_to_end(key)
+            return slot
+
+        if self.next_free_slot < self.max_keys:
+            slot = self.next_free_slot
+            self.next_free_slot += 1
+        else:
+            # the least recently seen key gives up its slot
+            _, slot = self.slots.popitem(last=False)
+        self.slots[key] = slot
+
+        i = slot * SLOT_SIZE
+        if self.algorithm == TOKEN_BUCKET:
+            self.state[i] = self.capacity
+            self.state[i + 1] = now
+        else:
+            self.state[i] = now - now % self.period
+            self.state[i + 1] = 0
+        self.state[i + 2] = 0
+        return slot
+
+    def acquire(self, key, now: float = None) -> bool:
+        if now is None:
+            now = time.monotonic()
+        i = self.get_slot(key, now) * SLOT_SIZE
+        state = self.state
+
+        if self.algorithm == TOKEN_BUCKET:
+            tokens = min(self.capacity, state[i] + (now - state[i + 1]) * self.rate)
+            state[i + 1] = now
+            if tokens < 1:
+                state[i] = tokens
+                return False
+            state[i] = tokens - 1
+            return True
+
+        window_start = now - now % self.period
+        if window_start != state[i]:
+            # the old current window becomes the previous one only if it is directly adjacent
+            state[i + 1] = state[i + 2] if window_start - state[i] == self.period else 0
+            state[i + 2] = 0
+            state[i] = window_start
+        weight = 1 - (now - window_start) / self.period
+        if state[i + 1] * weight + state[i + 2] + 1 > self.limit:
+            return False
+        state[i + 2] += 1
+        return True
+
+    def __len__(self):
+        return len(self.slots)
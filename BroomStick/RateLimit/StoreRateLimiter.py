@@ -0,0 +1,30 @@
+import time
+
+from BroomStick.Store.Store import Store
+
+
+class StoreRateLimiter:
+
+    # sliding window over per window counters kept in the shared state store
+    def __init__(self, store: Store, scope: str, limit: float, period: float):
+        self.store = store
+        self.scope = scope
+        self.limit = limit
+        self.period = period
+
+    def get_window_key(self, key, window: int) -> str:
+        return "rateLimit:" + self.scope + ":" + str(key) + ":" + str(window)
+
+    async def acquire(self, key) -> bool:
+        now = time.time()
+        window = int(now // self.period)
+        # counters live for two windows so the next one can still weigh this one in
+        window_key = self.get_window_key(key, window)
+        current = await self.store.incr(window_key, 1, self.period * 2)
+        previous = await self.store.get_counter(self.get_window_key(key, window - 1))
+        weight = 1 - (now - window * self.period) / self.period
+        # the increment above already counts this request, a rejected one is taken back out
+        if previous * weight + current <= self.limit:
+            return True
+        await self.store.incr(window_key, -1, self.period * 2)
+        return False
@@ -0,0 +1,25 @@
+from collections import deque
+from typing import Optional
+
+
+class LatencyTracker:
+
+    # recent upstream latencies of a route, percentiles are re-sorted only every few samples
+    def __init__(self, size: int = 256, resort_every: int = 16):
+        self.samples = deque(maxlen=size)
+        self.resort_every = resort_every
+        self.sorted_samples = []
+        self.unsorted_count = 0
+
+    def record(self, latency: float):
+        self.samples.append(latency)
+        self.unsorted_count += 1
+
+    def get_percentile(self, fraction: float, min_samples: int = 20) -> Optional[float]:
+        if len(self.samples) < min_samples:
+            return None
+        if self.unsorted_count >= self.resort_every or len(self.sorted_samples) == 0:
+            self.sorted_samples = sorted(self.samples)
+            self.unsorted_count = 0
+        index = min(len(self.sorted_samples) - 1, int(fraction * len(self.sorted_samples)))
+        return self.sorted_samples[index]
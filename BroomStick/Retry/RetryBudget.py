@@ -0,0 +1,30 @@
+import time
+
+
+class RetryBudget:
+
+    # every request deposits a fraction of a token and every retry or hedge spends a whole one,
+    # so extra attempts stay a bounded share of the traffic even while a backend is failing
+    def __init__(self, ratio: float = 0.2, min_per_second: float = 5, max_tokens: float = 20):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self.last_refill = time.monotonic()
+
+    def refill(self):
+        # a small floor keeps retries possible on routes with little traffic
+        now = time.monotonic()
+        self.tokens = min(self.max_tokens, self.tokens + (now - self.last_refill) * self.min_per_second)
+        self.last_refill = now
+
+    def deposit(self):
+        self.refill()
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def try_withdraw(self) -> bool:
+        self.refill()
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
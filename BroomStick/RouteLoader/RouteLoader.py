@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import asyncio
+import glob
+import json
+import os
+import traceback
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from fastapi import Request, Response
+
+from BroomStick.data_class.APIResponse import APIResponse, CommonAPIResponse
+from BroomStick.data_class.Route import Route
+from BroomStick.data_class.RouteIndex import RouteIndex
+from BroomStick.utils.JsonTools import flatten_dict, unflatten_dict
+
+if TYPE_CHECKING:
+    from BroomStick import BroomStick
+
+
+class RouteLoader:
+
+    def __init__(self, main: BroomStick, directory: str = "routes"):
+        self.main: BroomStick = main
+        self.directory = directory
+        self.config = self.main.config.get("routeReload", {})
+
+        # path -> (mtime, size) and the merged route definitions parsed from it
+        self.file_versions: Dict[str, Tuple[int, int]] = {}
+        self.file_routes: Dict[str, List[dict]] = {}
+        self.last_seen: Optional[Dict[str, Tuple[int, int]]] = None
+
+        self.reload_lock: Optional[asyncio.Lock] = None
+        self.watch_task: Optional[asyncio.Task] = None
+
+        self.register_routes()
+
+    def register_routes(self):
+        # opt in, like every control path it takes precedence over a proxied route at the same path
+        if not self.config.get("enabled", False):
+            return
+
+        @self.main.app.post(self.config.get("path", "/routes/reload"))
+        async def reload_routes(request: Request, response: Response, dryRun: bool = False):
+            if request.headers.get("Authorization") != self.main.config["AuthorizationAPIKey"]:
+                response.status_code = CommonAPIResponse.UnAuthorized.code
+                return CommonAPIResponse.UnAuthorized.get_response_object()
+            summary = await self.reload(dry_run=dryRun)
+            if len(summary["errors"]) != 0:
+                result = APIResponse("invalid_routes", "Invalid Routes", summary, 400)
+            else:
+                result = APIResponse("success", "Success", summary, 200)
+            response.status_code = result.code
+            return result.get_response_object()
+
+    @staticmethod
+    def get_route_key(datum: dict) -> str:
+        return json.dumps(datum, sort_keys=True, default=str)
+
+    def get_versions(self) -> Dict[str, Tuple[int, int]]:
+        versions = {}
+        for path in glob.glob(os.path.join(self.directory, "*.json")):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            versions[path] = (stat.st_mtime_ns, stat.st_size)
+        return versions
+
+    @staticmethod
+    def parse_file(path: str) -> List[dict]:
+        file = open(path)
+        data = json.loads(file.read())
+        file.close()
+
+        default = data.get("default")
+        if default is None:
+            return []
+        default = flatten_dict(default)
+
+        routes = []
+        for datum in data.get("routes", []):
+            if not isinstance(datum, dict):
+                raise ValueError("route entries must be objects")
+            datum = flatten_dict(datum)
+            base = default.copy()
+            base.update(datum)
+            routes.append(unflatten_dict(base))
+        return routes
+
+    def read_routes(self, versions: Dict[str, Tuple[int, int]]):
+        # only files whose mtime or size changed are parsed again
+        file_routes = {}
+        errors = []
+        for path in sorted(versions):
+            if self.file_versions.get(path) == versions[path] and path in self.file_routes:
+                file_routes[path] = self.file_routes[path]
+                continue
+            try:
+                file_routes[path] = self.parse_file(path)
+            except Exception as e:
+                errors.append(path + ": " + str(e))
+        return file_routes, errors
+
+    @staticmethod
+    def validate(datum: dict):
+        route_info = datum.get("routeInfo")
+        if not isinstance(route_info, dict):
+            raise ValueError("routeInfo is missing")
+        if not isinstance(route_info.get("path"), str):
+            raise ValueError("routeInfo.path must be a string")
+        if not isinstance(route_info.get("backends"), list):
+            raise ValueError("routeInfo.backends must be a list")
+        urls = set()
+        for backend in route_info["backends"]:
+            if isinstance(backend, dict):
+                url = backend.get("url")
+                weight = backend.get("weight", 1)
+                if not isinstance(weight, int) or isinstance(weight, bool) or weight < 1:
+                    raise ValueError("routeInfo.backends weights must be integers of at least 1")
+            else:
+                url = backend
+            if not isinstance(url, str):
+                raise ValueError("routeInfo.backends entries must be urls or objects with a url")
+            # balancers key their state by url, a repeated one would merge into a single backend
+            if url in urls:
+                raise ValueError("routeInfo.backends lists " + url + " more than once")
+            urls.add(url)
+
+    def build(self, file_routes: Dict[str, List[dict]]):
+        # routes whose merged definition did not change keep their Route object and with it every function's state
+        existing: Dict[str, List[Route]] = {}
+        for route in self.main.routes:
+            existing.setdefault(self.get_route_key(route.route_info), []).append(route)
+
+        routes = []
+        errors = []
+        reused = 0
+        for path, datums in file_routes.items():
+            for datum in datums:
+                candidates = existing.get(self.get_route_key(datum))
+                if candidates:
+                    routes.append(candidates.pop())
+                    reused += 1
+                    continue
+                try:
+                    self.validate(datum)
+                    routes.append(Route(self.main, datum))
+                except Exception as e:
+                    errors.append(path + " " + str(datum.get("routeInfo", {}).get("path")) + ": " + str(e))
+
+        routes.sort(key=lambda x: len(x.route_info_function.get_path()), reverse=True)
+        summary = {
+            "files": len(file_routes),
+            "routes": len(routes),
+            "unchanged": reused,
+            "added": len(routes) - reused,
+            "removed": len(self.main.routes) - reused,
+            "errors": errors
+        }
+        return routes, summary
+
+    def apply(self, routes: List[Route], route_index: RouteIndex, versions: Dict[str, Tuple[int, int]], file_routes: Dict[str, List[dict]]):
+        # both are swapped in one step with nothing awaited in between, requests see either table but never a mix
+        self.main.routes = routes
+        self.main.route_index = route_index
+        self.file_versions = versions
+        self.file_routes = file_routes
+        self.main.health_checker.sync()
+        self.warn_shadowed_routes()
+
+    def warn_shadowed_routes(self):
+        gateway = getattr(self.main, "gateway", None)
+        if gateway is None:
+            return
+        for warning in gateway.get_shadowed_routes(self.main.routes):
+            print("Route warning {" + warning + "}")
+
+    def load(self):
+        versions = self.get_versions()
+        file_routes, errors = self.read_routes(versions)
+        if len(errors) != 0:
+            raise ValueError("could not load routes: " + "; ".join(errors))
+        routes, summary = self.build(file_routes)
+        if len(summary["errors"]) != 0:
+            raise ValueError("could not load routes: " + "; ".join(summary["errors"]))
+        self.apply(routes, RouteIndex(routes), versions, file_routes)
+        self.last_seen = versions
+
+    async def reload(self, dry_run: bool = False) -> dict:
+        if self.reload_lock is None:
+            self.reload_lock = asyncio.Lock()
+        async with self.reload_lock:
+            loop = asyncio.get_event_loop()
+            versions = await loop.run_in_executor(None, self.get_versions)
+            file_routes, read_errors = await loop.run_in_executor(None, self.read_routes, versions)
+            routes, summary = self.build(file_routes)
+            summary["errors"] = read_errors + summary["errors"]
+            summary["dryRun"] = dry_run
+            if len(summary["errors"]) != 0:
+                summary["applied"] = False
+                return summary
+
+            route_index = await loop.run_in_executor(None, RouteIndex, routes)
+            if not dry_run:
+                self.apply(routes, route_index, versions, file_routes)
+            summary["applied"] = not dry_run
+            return summary
+
+    def start(self):
+        if not self.config.get("watch", True) or self.watch_task is not None:
+            return
+        self.watch_task = asyncio.ensure_future(self.watch_loop())
+
+    async def stop(self):
+        if self.watch_task is None:
+            return
+        self.watch_task.cancel()
+        try:
+            await self.watch_task
+        except asyncio.CancelledError:
+            pass
+        self.watch_task = None
+
+    async def watch_loop(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            await asyncio.sleep(self.config.get("interval", 2))
+            try:
+                versions = await loop.run_in_executor(None, self.get_versions)
+                # a broken file is reported once and retried when it changes again
+                if versions == self.last_seen:
+                    continue
+                self.last_seen = versions
+                summary = await self.reload()
+                if len(summary["errors"]) != 0:
+                    print("Route reload failed", summary["errors"])
+            except Exception:
+                traceback.print_exc()
@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import mmap
+import os
+import struct
+import time
+import traceback
+from typing import TYPE_CHECKING, Dict, Hashable, List, Optional, Tuple
+
+from BroomStick.Authenticator.AuthenticatedUser import AuthenticatedUser
+from BroomStick.Cache.CachedResponse import CachedResponse
+
+if TYPE_CHECKING:
+    from BroomStick import BroomStick
+
+
+MAGIC = b"BSSNAP02"
+# magic, sha256 fingerprint of config and routes, record count
+FILE_HEADER = struct.Struct("<8s32sI")
+# record type, key length, value length, expires at (wall clock)
+RECORD_HEADER = struct.Struct("<BHId")
+
+USER_RECORD = 1
+API_KEY_RECORD = 2
+RESPONSE_RECORD = 3
+
+
+def to_tuple(value):
+    if isinstance(value, list):
+        return tuple(to_tuple(item) for item in value)
+    return value
+
+
+class CacheSnapshot:
+
+    # warm start for the auth caches and the response cache. the file is memory mapped at startup and
+    # entries are only decoded when a cache misses on them, expired ones are never handed out
+    def __init__(self, main: BroomStick):
+        self.main: BroomStick = main
+        self.config = self.main.config.get("cacheSnapshot", {})
+        self.path = self.config.get("path", "cache.snapshot")
+
+        self.file = None
+        self.mapped: Optional[mmap.mmap] = None
+        # (record type, key) -> (value offset, value length, expires at)
+        self.index: Dict[Tuple[int, Hashable], Tuple[int, int, float]] = {}
+        self.task: Optional[asyncio.Task] = None
+
+    def is_enabled(self):
+        return self.config.get("enabled", False)
+
+    def get_fingerprint(self) -> bytes:
+        # a snapshot taken under other settings or routes could hand out answers they no longer produce
+        digest = hashlib.sha256()
+        digest.update(json.dumps(self.main.config, sort_keys=True, default=str).encode("utf-8"))
+        for route_key in sorted(self.main.route_loader.get_route_key(route.route_info) for route in self.main.routes):
+            digest.update(route_key.encode("utf-8"))
+        return digest.digest()
+
+    def open(self):
+        if not self.is_enabled() or not os.path.exists(self.path):
+            return
+        try:
+            self.file = open(self.path, "rb")
+            self.mapped = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, fingerprint, count = FILE_HEADER.unpack_from(self.mapped, 0)
+            if magic != MAGIC or fingerprint != self.get_fingerprint():
+                self.close()
+                return
+            self.build_index(count)
+        except (OSError, ValueError, struct.error):
+            traceback.print_exc()
+            self.close()
+
+    def build_index(self, count: int):
+        now = time.time()
+        offset = FILE_HEADER.size
+        for _ in range(count):
+            record_type, key_length, value_length, expires_at = RECORD_HEADER.unpack_from(self.mapped, offset)
+            offset += RECORD_HEADER.size
+            key = self.mapped[offset:offset + key_length].decode("utf-8")
+            offset += key_length
+            if expires_at > now:
+                if record_type == RESPONSE_RECORD:
+                    key = to_tuple(json.loads(key))
+                self.index[(record_type, key)] = (offset, value_length, expires_at)
+            offset += value_length
+
+    def close(self):
+        self.index = {}
+        if self.mapped is not None:
+            self.mapped.close()
+            self.mapped = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def take(self, record_type: int, key: Hashable) -> Optional[Tuple[bytes, float]]:
+        # every entry is handed out once, after that the live cache owns it
+        location = self.index.pop((record_type, key), None)
+        if location is None:
+            return None
+        offset, length, expires_at = location
+        if expires_at <= time.time():
+            return None
+        value = self.mapped[offset:offset + length]
+        if len(self.index) == 0:
+            self.close()
+        return value, expires_at
+
+    def take_user(self, user_id: str) -> Optional[Tuple[AuthenticatedUser, float]]:
+        found = self.take(USER_RECORD, user_id)
+        if found is None:
+            return None
+        data = json.loads(found[0])
+        return AuthenticatedUser(user_id, data["username"], data["metadata"], data["tokenVersion"]), found[1] - time.time()
+
+    def take_api_key(self, api_key_digest: str) -> Optional[Tuple[str, float]]:
+        found = self.take(API_KEY_RECORD, api_key_digest)
+        if found is None:
+            return None
+        return found[0].decode("utf-8"), found[1] - time.time()
+
+    def take_response(self, key: tuple) -> Optional[CachedResponse]:
+        found = self.take(RESPONSE_RECORD, key)
+        if found is None:
+            return None
+        return CachedResponse.from_bytes(found[0])
+
+    def collect_records(self) -> List[Tuple[int, str, bytes, float]]:
+        now = time.time()
+        monotonic_now = time.monotonic()
+        records = []
+
+        authenticator = self.main.authenticator
+        for user_id, entry in authenticator.cached_users.entries.items():
+            if entry.expires_at > monotonic_now and entry.value is not None:
+                value = json.dumps({"username": entry.value.username, "metadata": entry.value.metadata, "tokenVersion": entry.value.token_version}, default=str)
+                records.append((USER_RECORD, user_id, value.encode("utf-8"), now + entry.expires_at - monotonic_now))
+        # api keys are bearer credentials, the cache only holds their digests and only those are written
+        for api_key_digest, entry in authenticator.api_key_user_id_cache.entries.items():
+            if entry.expires_at > monotonic_now and entry.value is not None:
+                records.append((API_KEY_RECORD, api_key_digest, entry.value.encode("utf-8"), now + entry.expires_at - monotonic_now))
+
+        # responses cached per user stay in memory unless asked for, the key tuple holds the owner
+        include_user_responses = self.config.get("includeUserResponses", False)
+        for key, entry in self.main.response_cache.entries.items():
+            if key[4] is not None and not include_user_responses:
+                continue
+            data = entry.to_bytes() if entry.stale_until > now else None
+            if data is not None:
+                records.append((RESPONSE_RECORD, json.dumps(key), data, entry.stale_until))
+
+        # entries nobody asked for since the last start are carried over while they are still valid
+        for (record_type, key), (offset, length, expires_at) in self.index.items():
+            if expires_at > now:
+                if record_type == RESPONSE_RECORD:
+                    key = json.dumps(key)
+                records.append((record_type, key, self.mapped[offset:offset + length], expires_at))
+        return records
+
+    def write(self, records: List[Tuple[int, str, bytes, float]], fingerprint: bytes):
+        # written next to the target and renamed over it, readers never see a half written file.
+        # only the gateway's own user may read it, it holds user data and cached responses
+        temporary_path = self.path + "." + str(os.getpid()) + ".tmp"
+        file = os.fdopen(os.open(temporary_path, os.O_CREAT | os.O_WRONLY | os.O_TRUNC, 0o600), "wb")
+        file.write(FILE_HEADER.pack(MAGIC, fingerprint, len(records)))
+        for record_type, key, value, expires_at in records:
+            key = key.encode("utf-8")
+            file.write(RECORD_HEADER.pack(record_type, len(key), len(value), expires_at))
+            file.write(key)
+            file.write(value)
+        file.close()
+        os.replace(temporary_path, self.path)
+
+    async def save(self):
+        if not self.is_enabled():
+            return
+        records = self.collect_records()
+        fingerprint = self.get_fingerprint()
+        await asyncio.get_event_loop().run_in_executor(None, self.write, records, fingerprint)
+
+    def start(self):
+        if not self.is_enabled() or self.config.get("interval", 60) <= 0 or self.task is not None:
+            return
+        self.task = asyncio.ensure_future(self.save_loop())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        try:
+            await self.save()
+        except Exception:
+            traceback.print_exc()
+        self.close()
+
+    async def save_loop(self):
+        while True:
+            await asyncio.sleep(self.config.get("interval", 60))
+            try:
+                await self.save()
+            except Exception:
+                traceback.print_exc()
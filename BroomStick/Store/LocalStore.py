@@ -0,0 +1,53 @@
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from BroomStick.Store.Store import Store
+
+
+class LocalStore(Store):
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        # key -> (value, expires_at)
+        self.entries: OrderedDict = OrderedDict()
+
+    def get_entry(self, key: str):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= time.time():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def put_entry(self, key: str, value, expires_at: float):
+        self.entries[key] = (value, expires_at)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_keys:
+            self.entries.popitem(last=False)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self.get_entry(key)
+        return entry[0] if entry is not None else None
+
+    async def set(self, key: str, value: bytes, ttl: float) -> bool:
+        self.put_entry(key, bytes(value), time.time() + ttl)
+        return True
+
+    async def delete(self, key: str):
+        self.entries.pop(key, None)
+
+    async def incr(self, key: str, amount: float, ttl: float) -> float:
+        entry = self.get_entry(key)
+        if entry is None:
+            self.put_entry(key, amount, time.time() + ttl)
+            return amount
+        value = entry[0] + amount
+        self.put_entry(key, value, entry[1])
+        return value
+
+    async def get_counter(self, key: str) -> float:
+        entry = self.get_entry(key)
+        return entry[0] if entry is not None else 0
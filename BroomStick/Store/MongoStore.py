@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import datetime
+from typing import TYPE_CHECKING, Optional
+
+import pymongo
+from pymongo import ReturnDocument
+
+from BroomStick.Store.Store import Store
+
+if TYPE_CHECKING:
+    from BroomStick import BroomStick
+
+
+class MongoStore(Store):
+
+    # shared by every gateway worker and host that talks to the same mongo
+    def __init__(self, main: BroomStick, collection: str = "state"):
+        self.main: BroomStick = main
+        self.collection = self.main.mongo["BroomStick"][collection]
+        self.index_created = False
+
+    def is_shared(self) -> bool:
+        return True
+
+    async def create_indexes(self):
+        if self.index_created:
+            return
+        await self.collection.create_index([("expireAt", pymongo.ASCENDING)], expireAfterSeconds=0)
+        self.index_created = True
+
+    @staticmethod
+    def expire_at(ttl: float) -> datetime.datetime:
+        return datetime.datetime.utcnow() + datetime.timedelta(seconds=ttl)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        # the ttl index only sweeps once a minute, so expiry is checked here as well
+        document = await self.collection.find_one({"_id": key, "expireAt": {"$gt": datetime.datetime.utcnow()}})
+        if document is None:
+            return None
+        return bytes(document["value"])
+
+    async def set(self, key: str, value: bytes, ttl: float) -> bool:
+        await self.create_indexes()
+        await self.collection.update_one({"_id": key}, {"$set": {"value": value, "expireAt": self.expire_at(ttl)}}, upsert=True)
+        return True
+
+    async def delete(self, key: str):
+        await self.collection.delete_one({"_id": key})
+
+    async def incr(self, key: str, amount: float, ttl: float) -> float:
+        await self.create_indexes()
+        document = await self.collection.find_one_and_update(
+            {"_id": key},
+            {"$inc": {"counter": amount}, "$setOnInsert": {"expireAt": self.expire_at(ttl)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return document["counter"]
+
+    async def get_counter(self, key: str) -> float:
+        document = await self.collection.find_one({"_id": key, "expireAt": {"$gt": datetime.datetime.utcnow()}})
+        if document is None:
+            return 0
+        return document.get("counter", 0)
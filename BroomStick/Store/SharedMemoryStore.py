@@ -0,0 +1,189 @@
+import asyncio
+import fcntl
+import hashlib
+import os
+import struct
+import tempfile
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import Optional
+
+from BroomStick.Store.Store import Store
+
+# per slot: key hash, expires at (wall clock), value length, key length, padding. the key bytes
+# follow the header, the value follows the key area
+SLOT_HEADER = struct.Struct("<QdIH2x")
+COUNTER = struct.Struct("<d")
+
+
+class FileLock:
+
+    def __init__(self, file, retry_interval: float = 0.0005):
+        self.file = file
+        self.retry_interval = retry_interval
+
+    def __enter__(self):
+        fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+
+    def __exit__(self, *args):
+        fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+
+    async def __aenter__(self):
+        # never blocks the event loop, a lock held by another worker is polled for instead
+        while True:
+            try:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return
+            except BlockingIOError:
+                await asyncio.sleep(self.retry_interval)
+
+    async def __aexit__(self, *args):
+        fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+
+
+def hash_key(key: bytes) -> int:
+    # 0 marks an empty slot
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little") | 1
+
+
+class SharedMemoryStore(Store):
+
+    # a fixed size open addressing table in a named shared memory segment, guarded by a file lock.
+    # nothing is awaited while the lock is held, so coroutines of one worker never interleave inside it
+    def __init__(self, name: str = "broomstick", slots: int = 8192, value_size: int = 8192, probe_length: int = 16, create: bool = False, key_size: int = 256):
+        self.name = name
+        self.slots = slots
+        # long keys are stored as their digest, which always has to fit
+        self.key_size = max(key_size, 64)
+        self.value_size = value_size
+        self.slot_size = SLOT_HEADER.size + key_size + value_size
+        self.probe_length = min(probe_length, slots)
+
+        self.lock_file = open(os.path.join(tempfile.gettempdir(), name + ".lock"), "a+b")
+        self.lock = FileLock(self.lock_file)
+        with self.lock:
+            self.memory = self.open_segment(create)
+        self.buffer = self.memory.buf
+
+    def open_segment(self, create: bool) -> shared_memory.SharedMemory:
+        size = self.slots * self.slot_size
+        if create:
+            try:
+                stale = shared_memory.SharedMemory(name=self.name)
+                stale.close()
+                stale.unlink()
+            except FileNotFoundError:
+                pass
+        try:
+            memory = shared_memory.SharedMemory(name=self.name)
+            if memory.size < size:
+                raise ValueError("shared memory segment " + self.name + " is smaller than the configured store")
+        except FileNotFoundError:
+            memory = shared_memory.SharedMemory(name=self.name, create=True, size=size)
+        # the segment outlives single workers, only unlink() removes it
+        try:
+            resource_tracker.unregister(memory._name, "shared_memory")
+        except Exception:
+            pass
+        return memory
+
+    def is_shared(self) -> bool:
+        return True
+
+    def find_slot(self, key: bytes, key_hash: int, now: float, for_write: bool) -> Optional[int]:
+        start = key_hash % self.slots
+        free = None
+        oldest = None
+        oldest_expiry = None
+        for i in range(self.probe_length):
+            offset = ((start + i) % self.slots) * self.slot_size
+            slot_hash, expires_at, _, key_length = SLOT_HEADER.unpack_from(self.buffer, offset)
+            # the hash only narrows it down, keys whose hashes collide must not share a slot
+            if slot_hash == key_hash and self.buffer[offset + SLOT_HEADER.size:offset + SLOT_HEADER.size + key_length] == key:
+                return offset
+            if not for_write:
+                continue
+            if free is None and (slot_hash == 0 or expires_at <= now):
+                free = offset
+            if oldest_expiry is None or expires_at < oldest_expiry:
+                oldest = offset
+                oldest_expiry = expires_at
+        if not for_write:
+            return None
+        # a full probe window gives up the entry closest to expiring
+        return free if free is not None else oldest
+
+    def read(self, key: bytes, now: float):
+        offset = self.find_slot(key, hash_key(key), now, False)
+        if offset is None:
+            return None, None
+        _, expires_at, length, _ = SLOT_HEADER.unpack_from(self.buffer, offset)
+        if expires_at <= now:
+            return None, None
+        start = offset + SLOT_HEADER.size + self.key_size
+        return offset, bytes(self.buffer[start:start + length])
+
+    def write(self, key: bytes, offset: int, value: bytes, expires_at: float):
+        SLOT_HEADER.pack_into(self.buffer, offset, hash_key(key), expires_at, len(value), len(key))
+        start = offset + SLOT_HEADER.size
+        self.buffer[start:start + len(key)] = key
+        start += self.key_size
+        self.buffer[start:start + len(value)] = value
+
+    def encode_key(self, key: str) -> bytes:
+        key = key.encode("utf-8")
+        if len(key) > self.key_size:
+            return b"#" + hashlib.sha256(key).digest()
+        return key
+
+    async def get(self, key: str) -> Optional[bytes]:
+        key = self.encode_key(key)
+        async with self.lock:
+            return self.read(key, time.time())[1]
+
+    async def set(self, key: str, value: bytes, ttl: float) -> bool:
+        key = self.encode_key(key)
+        if len(value) > self.value_size:
+            return False
+        now = time.time()
+        async with self.lock:
+            self.write(key, self.find_slot(key, hash_key(key), now, True), value, now + ttl)
+        return True
+
+    async def delete(self, key: str):
+        key = self.encode_key(key)
+        async with self.lock:
+            offset = self.find_slot(key, hash_key(key), time.time(), False)
+            if offset is not None:
+                SLOT_HEADER.pack_into(self.buffer, offset, 0, 0.0, 0, 0)
+
+    async def incr(self, key: str, amount: float, ttl: float) -> float:
+        key = self.encode_key(key)
+        now = time.time()
+        async with self.lock:
+            offset, value = self.read(key, now)
+            if value is None:
+                offset = self.find_slot(key, hash_key(key), now, True)
+                expires_at = now + ttl
+                result = amount
+            else:
+                expires_at = SLOT_HEADER.unpack_from(self.buffer, offset)[1]
+                result = COUNTER.unpack(value)[0] + amount
+            self.write(key, offset, COUNTER.pack(result), expires_at)
+        return result
+
+    async def get_counter(self, key: str) -> float:
+        key = self.encode_key(key)
+        async with self.lock:
+            value = self.read(key, time.time())[1]
+        return COUNTER.unpack(value)[0] if value is not None else 0
+
+    def close(self):
+        self.buffer = None
+        self.memory.close()
+        self.lock_file.close()
+
+    def unlink(self):
+        # unlink() unregisters from the resource tracker again, which it no longer knows about
+        resource_tracker.register(self.memory._name, "shared_memory")
+        self.memory.unlink()
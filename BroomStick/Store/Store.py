@@ -0,0 +1,26 @@
+from typing import Optional
+
+
+class Store:
+
+    # state that has to agree between gateway workers, values are raw bytes
+    def is_shared(self) -> bool:
+        return False
+
+    async def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: bytes, ttl: float) -> bool:
+        raise NotImplementedError
+
+    async def delete(self, key: str):
+        raise NotImplementedError
+
+    async def incr(self, key: str, amount: float, ttl: float) -> float:
+        raise NotImplementedError
+
+    async def get_counter(self, key: str) -> float:
+        raise NotImplementedError
+
+    def close(self):
+        pass
@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from BroomStick.Store.LocalStore import LocalStore
+from BroomStick.Store.MongoStore import MongoStore
+from BroomStick.Store.SharedMemoryStore import SharedMemoryStore
+from BroomStick.Store.Store import Store
+
+if TYPE_CHECKING:
+    from BroomStick import BroomStick
+
+
+def create_store(main: BroomStick, config: dict, create: bool = False) -> Store:
+    store_type = config.get("type", "local")
+    if store_type == "local":
+        return LocalStore(config.get("maxKeys", 100000))
+    if store_type == "sharedMemory":
+        return SharedMemoryStore(
+            config.get("name", "broomstick"),
+            config.get("slots", 8192),
+            config.get("valueSize", 8192),
+            config.get("probeLength", 16),
+            create,
+            config.get("keySize", 256)
+        )
+    if store_type == "mongo":
+        return MongoStore(main, config.get("collection", "state"))
+    raise ValueError("Unknown state store " + str(store_type))
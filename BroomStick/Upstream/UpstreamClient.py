@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Dict, List, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+from starlette.datastructures import MutableHeaders
+
+if TYPE_CHECKING:
+    from BroomStick import BroomStick
+
+
+# headers that only make sense for a single connection and must not be forwarded
+HOP_BY_HOP_HEADERS = {
+    b"connection",
+    b"keep-alive",
+    b"proxy-authenticate",
+    b"proxy-authorization",
+    b"te",
+    b"trailers",
+    b"transfer-encoding",
+    b"upgrade",
+}
+
+
+class UpstreamClient:
+
+    def __init__(self, main: BroomStick):
+        self.main: BroomStick = main
+        self.clients: Dict[str, httpx.AsyncClient] = {}
+
+    def get_config(self):
+        return self.main.config.get("upstream", {})
+
+    def get_limits(self):
+        config = self.get_config()
+        return httpx.Limits(
+            max_connections=config.get("poolSize", 100),
+            max_keepalive_connections=config.get("keepAlivePoolSize", 20),
+            keepalive_expiry=config.get("keepAliveExpiry", 5.0)
+        )
+
+    def get_timeout(self):
+        config = self.get_config()
+        return httpx.Timeout(
+            connect=config.get("connectTimeout", 5.0),
+            read=config.get("readTimeout", 30.0),
+            write=config.get("writeTimeout", 30.0),
+            pool=config.get("poolTimeout", 5.0)
+        )
+
+    def get_client(self, url: str) -> httpx.AsyncClient:
+        # one pool per backend origin so a slow backend can not starve the others
+        parts = urlsplit(url)
+        origin = parts.scheme + "://" + parts.netloc
+        client = self.clients.get(origin)
+        if client is None:
+            client = httpx.AsyncClient(
+                limits=self.get_limits(),
+                timeout=self.get_timeout(),
+                http2=self.get_config().get("http2", False),
+                follow_redirects=False
+            )
+            self.clients[origin] = client
+        return client
+
+    def get_stream_timeout(self):
+        config = self.get_config()
+        timeout = self.get_timeout()
+        # long lived streams (SSE, downloads) may stay idle for longer than a normal read
+        return httpx.Timeout(
+            connect=timeout.connect,
+            read=config.get("streamReadTimeout"),
+            write=timeout.write,
+            pool=timeout.pool
+        )
+
+    def filter_headers(self, headers: List[Tuple[bytes, bytes]], keep_content_length=False, exclude=()) -> List[Tuple[bytes, bytes]]:
+        # works on raw header lists so repeated headers such as set-cookie survive
+        result = []
+        for key, value in headers:
+            key = key.lower()
+            if key in HOP_BY_HOP_HEADERS or key in exclude:
+                continue
+            if key == b"content-length" and not keep_content_length:
+                continue
+            result.append((key, value))
+        return result
+
+    async def request(self, method: str, url: str, headers: MutableHeaders, content=None) -> Tuple[httpx.Response, bytes]:
+        # the body is returned exactly as sent, still compressed if the backend compressed it
+        client = self.get_client(url)
+        request = client.build_request(method, url, headers=self.filter_headers(headers.raw), content=content)
+        response = await client.send(request, stream=True)
+        try:
+            body = b"".join([chunk async for chunk in response.aiter_raw()])
+        finally:
+            await response.aclose()
+        return response, body
+
+    @staticmethod
+    def decode_body(response: httpx.Response, body: bytes) -> bytes:
+        return httpx.Response(response.status_code, headers=response.headers, content=body).read()
+
+    async def stream(self, method: str, url: str, headers: MutableHeaders, content=None) -> httpx.Response:
+        # the caller owns the returned response and has to aclose() it once the body is consumed
+        client = self.get_client(url)
+        request = client.build_request(
+            method,
+            url,
+            headers=self.filter_headers(headers.raw, keep_content_length=content is not None),
+            content=content,
+            timeout=self.get_stream_timeout()
+        )
+        return await client.send(request, stream=True)
+
+    async def close(self):
+        for client in self.clients.values():
+            await client.aclose()
+        self.clients = {}
@@ -1,198 +1,402 @@
-import glob
+import asyncio
+import inspect
 import json
-import random
+import os
+import httpx
 import uvicorn
-import re
+import time
+from typing import Optional
 
-import requests
 from fastapi import FastAPI, Request, Response, status, UploadFile
-from pymongo import MongoClient
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.datastructures import MutableHeaders
+from motor.motor_asyncio import AsyncIOMotorClient
 from starlette.middleware.cors import CORSMiddleware
 
+from BroomStick.AccessLog.AccessLog import AccessLog
 from BroomStick.Authenticator.Authenticator import Authenticator
+from BroomStick.Cache.ResponseCache import ResponseCache
+from BroomStick.Gateway.GatewayApplication import GatewayApplication
+from BroomStick.LoadBalancer.BackendRegistry import BackendRegistry
+from BroomStick.LoadBalancer.BackendState import BackendState
+from BroomStick.LoadBalancer.HealthChecker import HealthChecker
+from BroomStick.Metrics.GatewayMetrics import GatewayMetrics
+from BroomStick.RouteLoader.RouteLoader import RouteLoader
+from BroomStick.Snapshot.CacheSnapshot import CacheSnapshot
+from BroomStick.Store.Stores import create_store
 from BroomStick.data_class.APIResponse import CommonAPIResponse, APIResponse
+from BroomStick.data_class.JsonBody import JsonBody, is_json_content_type
+from BroomStick.data_class.RequestContext import RequestContext
 from BroomStick.data_class.Route import Route
-from BroomStick.utils.JsonTools import flatten_dict, unflatten_dict
+from BroomStick.data_class.RouteIndex import RouteIndex
+from BroomStick.Upstream.UpstreamClient import UpstreamClient
+from BroomStick.utils.ContentEncoding import is_encoding_accepted
 
 
-class BroomStick:
+# upstream statuses that count against the health of a backend
+BACKEND_FAILURE_STATUS_CODES = {502, 503, 504}
 
-    def __init__(self):
-        self.app = FastAPI()
-        self.config = {}
-        file = open("config/config.json")
-        self.config = json.loads(file.read())
-        file.close()
-
-        self.app.add_middleware(
-            CORSMiddleware,
-            allow_origins=self.config["cors"],
-            allow_credentials=True,
-            allow_methods=["*"],
-            allow_headers=["*"],
-        )
 
-        self.mongo = MongoClient(self.config["mongodb"])
-        self.authenticator = Authenticator(self)
+def load_config(path="config/config.json"):
+    file = open(path)
+    config = json.loads(file.read())
+    file.close()
+    return config
 
-        self.routes = []
-        self.load_routes()
 
-        self.register_routes()
+def get_server_settings(config):
+    settings = {
+        "port": config["listeningPort"],
+        "host": "0.0.0.0"
+    }
+    if config["ssl"]["key"] != "" and config["ssl"]["cert"] != "":
+        settings["ssl_keyfile"] = config["ssl"]["key"]
+        settings["ssl_certfile"] = config["ssl"]["cert"]
+    return settings
 
-        dynamic_settings = {}
-        if self.config["ssl"]["key"] != "" and self.config["ssl"]["cert"] != "":
-            dynamic_settings = {
-                "ssl_keyfile": self.config["ssl"]["key"],
-                "ssl_certfile": self.config["ssl"]["cert"]
-            }
 
-        # start server
-        uvicorn.run(
-            self.app,
-            port=self.config["listeningPort"],
-            host="0.0.0.0",
+def create_app():
+    # app factory for uvicorn --factory, gunicorn or any other ASGI server
+    return BroomStick().gateway
 
-            **dynamic_settings
-        )
 
-    def load_routes(self):
-        for route in glob.glob("routes/*.json"):
-            file = open(route)
+def run_server(workers=None):
+    config = load_config()
+    if workers is None:
+        workers = config.get("workers", 1)
+    if workers == 0:
+        workers = os.cpu_count() or 1
+
+    # the launching process owns the shared segment so it starts clean and is removed once every worker exited
+    segment = None
+    store_config = config.get("stateStore", {})
+    if store_config.get("type") == "sharedMemory":
+        segment = create_store(None, store_config, create=True)
+    try:
+        if workers == 1:
+            BroomStick(config).run()
+        else:
+            uvicorn.run("BroomStick:create_app", factory=True, workers=workers, **get_server_settings(config))
+    finally:
+        if segment is not None:
+            segment.close()
+            segment.unlink()
+
+
+class BroomStick:
 
-            data = json.loads(file.read())
-            file.close()
+    def __init__(self, config=None):
+        self.app = FastAPI()
+        self.config = config if config is not None else load_config()
 
-            default = data.get("default")
-            if default is None:
-                continue
+        self.app.add_middleware(CORSMiddleware, **self.get_cors_options())
 
-            default = flatten_dict(default)
+        self.mongo = AsyncIOMotorClient(self.config["mongodb"], maxPoolSize=self.config.get("mongoPoolSize", 100))
+        self.state_store = create_store(self, self.config.get("stateStore", {}))
+        self.metrics = GatewayMetrics(self)
+        self.access_log = AccessLog(self)
+        self.authenticator = Authenticator(self)
+        self.upstream = UpstreamClient(self)
+        self.backend_registry = BackendRegistry(self.config.get("healthCheck", {}), self.config.get("backendConcurrency", {}))
+        self.health_checker = HealthChecker(self)
+        self.response_cache = ResponseCache(self.config.get("responseCache", {}).get("maxBytes", 64 * 1024 * 1024))
 
-            for datum in data.get("routes"):
-                datum = flatten_dict(datum)
-                base = default.copy()
-                base.update(datum)
-                datum = unflatten_dict(base)
-                route = Route(self, datum)
-                self.routes.append(route)
+        self.routes = []
+        self.route_index = RouteIndex([])
+        self.route_loader = RouteLoader(self)
+        self.load_routes()
 
-        # sort routes by route.length
-        self.routes.sort(key=lambda x: len(x.route_info_function.get_path()), reverse=True)
+        # warm start, opened once the routes are known since they are part of the snapshot's fingerprint
+        self.cache_snapshot = CacheSnapshot(self)
+        self.cache_snapshot.open()
+        self.authenticator.cached_users.warm_source = self.cache_snapshot.take_user
+        self.authenticator.api_key_user_id_cache.warm_source = self.cache_snapshot.take_api_key
+
+        self.register_metrics_route()
+        self.gateway = GatewayApplication(self)
+        self.route_loader.warn_shadowed_routes()
+
+        @self.app.on_event("startup")
+        async def create_indexes():
+            await self.authenticator.users.create_indexes()
+
+        @self.app.on_event("startup")
+        async def start_background_tasks():
+            self.health_checker.start()
+            self.route_loader.start()
+            await self.authenticator.start()
+            self.cache_snapshot.start()
+            self.access_log.start()
+
+        @self.app.on_event("shutdown")
+        async def close_upstream():
+            await self.route_loader.stop()
+            await self.health_checker.stop()
+            await self.authenticator.stop()
+            await self.cache_snapshot.stop()
+            await self.access_log.stop()
+            await self.upstream.close()
+            self.state_store.close()
+
+    def get_cors_options(self):
+        return {
+            "allow_origins": self.config["cors"],
+            "allow_credentials": True,
+            "allow_methods": ["*"],
+            "allow_headers": ["*"],
+        }
+
+    def run(self):
+        uvicorn.run(self.gateway, **get_server_settings(self.config))
 
-    async def process_request(self, request: Request, method: str):
+    def load_routes(self):
+        self.route_loader.load()
 
-        # only search for routes that have the correct hostname
-        available_routes_for_hostname = []
-        for route in self.routes:
-            if route.hostname_function.is_allowed_to_use(request) == CommonAPIResponse.Success:
-                available_routes_for_hostname.append(route)
+    async def process_request(self, request: Request, method: str, context: RequestContext = None):
+        if context is None:
+            context = RequestContext(self, request)
 
-        route = None
-        for route in available_routes_for_hostname:
-            route: Route = route
-            if route.route_info_function.matches_path(request.url.path):
-                break
-            else:
-                route = None
+        route = self.route_index.match(request.url.hostname, request.url.path)
+        context.mark("routeMatch")
         if route is None:
             return CommonAPIResponse.RouteNotFound
+        context.route = route
+        await context.resolve_user()
+        context.mark("authentication")
 
         if len(route.route_info_function.get_backends()) == 0:
             return CommonAPIResponse.NoBackendsFound
 
         for function in route.functions:
-            result = function.is_allowed_to_use(request)
+            result = function.is_allowed_to_use(request, context)
+            if inspect.isawaitable(result):
+                result = await result
             if result is not CommonAPIResponse.Success:
                 return result
+        context.mark("isAllowedToUse")
 
         path = request.url.path
         if route.route_info_function.should_remove_prefix():
-            pattern = route.route_info_function.get_path_pattern()
-            path = re.sub(pattern, "", path)
+            path = route.route_info_function.remove_prefix(path)
 
         query = ""
         if len(request.url.query) > 0:
             query = "?" + request.url.query
 
-        backend = random.choice(route.route_info_function.get_backends()) + path + query
-        # backend = route.route_info_function.clean_path(backend, remove_path_params=False)
-        # print(backend)
-
-        headers = dict(request.headers)
+        # a private copy of the raw header list, RouteFunctions edit it in place
+        headers = MutableHeaders(raw=list(request.scope["headers"]))
         # if "host" in headers: del headers["host"]
         # if "connection" in headers: del headers["connection"]
+        # without this the upstream client would ask for its own default encodings on the client's behalf
+        if "accept-encoding" not in headers:
+            headers["accept-encoding"] = "identity"
 
-        cookies = dict(request.cookies)
+        cookies = request.cookies
 
+        streaming = route.route_info_function.is_streaming()
+
+        # the body is only read here, JSON parsing waits until a RouteFunction touches it.
+        # RouteFunctions get None for bodies that are not JSON
         json_object = None
-        if method == "POST" or method == "PUT" or method == "PATCH":
-            try:
-                json_object = await request.json()
-            except Exception:
-                pass
+        if not streaming and (method == "POST" or method == "PUT" or method == "PATCH") and is_json_content_type(request.headers.get("content-type")):
+            body = await request.body()
+            if len(body) != 0:
+                json_object = JsonBody(body)
+        context.mark("bodyParse")
 
         for function in route.functions:
-            result = function.handle_request(request, headers, cookies, json_object)
+            result = function.handle_request(request, headers, cookies, json_object, context)
+            if inspect.isawaitable(result):
+                result = await result
             if result is not CommonAPIResponse.Success:
                 return result
+        context.mark("handleRequest")
+
+        # requests answered by a RouteFunction never take a slot of the route's concurrency limit
+        limiter = route.route_info_function.get_concurrency_limiter()
+        if limiter is not None:
+            if not await limiter.acquire():
+                self.metrics.shed_requests.inc(("route",))
+                return CommonAPIResponse.RateLimited
+            started = time.perf_counter()
+            context.add_finish_callback(lambda: limiter.release(time.perf_counter() - started, context.backend_failed))
+        context.mark("admission")
+
+        res = await self.forward(request, method, path + query, headers, json_object, streaming, context)
+        context.mark("upstream")
+        if isinstance(res, APIResponse):
+            return res
 
-        params = {}
+        for function in route.functions:
+            result = function.after_handle_request(request, res, context)
+            if inspect.isawaitable(result):
+                result = await result
+            # a RouteFunction may answer with a response of its own, later functions see that one
+            if isinstance(result, Response):
+                res = result
+        context.mark("afterHandleRequest")
+
+        return res
+
+    def is_retryable(self, route: Route, res) -> bool:
+        return isinstance(res, APIResponse) or res.status_code in route.route_info_function.get_retry_status_codes()
+
+    async def forward(self, request: Request, method: str, path: str, headers: MutableHeaders, json_object: Optional[JsonBody], streaming: bool, context: RequestContext):
+        info = context.route.route_info_function
+        balancer = info.get_balancer()
+        budget = info.get_retry_budget()
+        budget.deposit()
+
+        # a streamed request body can only be sent once, so streaming routes get a single attempt
+        attempts = 1 if streaming else 1 + info.get_retry_attempts(method)
+        hedged = not streaming and info.is_hedged(method)
+
+        res = CommonAPIResponse.BackendDisconnected
+        tried = []
+        for attempt in range(attempts):
+            if attempt > 0:
+                if not budget.try_withdraw():
+                    break
+                self.metrics.upstream_retries.inc((info.get_path(), "retry"))
+            # picked only now so requests answered by a RouteFunction never claim a backend,
+            # retries go to a backend that was not tried yet
+            backend_state = balancer.select(context, tried)
+            if backend_state is None:
+                break
+            tried.append(backend_state)
+            if hedged:
+                res, backend_state = await self.send_hedged(request, method, path, headers, json_object, backend_state, tried, context)
+            else:
+                res = await self.send_upstream(request, method, path, headers, json_object, streaming, backend_state, context)
+            context.backend = backend_state.url
+            if not self.is_retryable(context.route, res):
+                break
+        return res
+
+    async def send_hedged(self, request: Request, method: str, path: str, headers: MutableHeaders, json_object: Optional[JsonBody], backend_state: BackendState, tried: list, context: RequestContext):
+        # a second attempt starts once the first is slower than the route's usual tail, the first usable answer wins
+        info = context.route.route_info_function
+        primary = asyncio.ensure_future(self.send_upstream(request, method, path, headers, json_object, False, backend_state, context))
+        tasks = {primary: backend_state}
+        try:
+            delay = info.get_hedge_delay()
+            if delay is not None:
+                done, _ = await asyncio.wait({primary}, timeout=delay)
+                if len(done) == 0 and info.get_retry_budget().try_withdraw():
+                    hedge_state = info.get_balancer().select(context, tried)
+                    if hedge_state is not None:
+                        tried.append(hedge_state)
+                        self.metrics.upstream_retries.inc((info.get_path(), "hedge"))
+                        hedge = asyncio.ensure_future(self.send_upstream(request, method, path, headers, json_object, False, hedge_state, context))
+                        tasks[hedge] = hedge_state
+
+            res = CommonAPIResponse.BackendDisconnected
+            pending = set(tasks)
+            while len(pending) != 0:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    res, backend_state = task.result(), tasks[task]
+                    if not self.is_retryable(context.route, res):
+                        return res, backend_state
+            return res, backend_state
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def send_upstream(self, request: Request, method: str, path: str, headers: MutableHeaders, json_object: Optional[JsonBody], streaming: bool, backend_state: BackendState, context: RequestContext):
+        backend = backend_state.url + path
+        limiter = backend_state.limiter
+        if limiter is not None:
+            try:
+                acquired = await limiter.acquire()
+            except asyncio.CancelledError:
+                backend_state.release_trial()
+                raise
+            if not acquired:
+                backend_state.release_trial()
+                self.metrics.shed_requests.inc(("backend",))
+                return CommonAPIResponse.BackendDisconnected
+
+        backend_state.on_start()
+        started = time.perf_counter()
+        try:
+            if streaming:
+                res = await self.forward_streaming(request, method, backend, headers)
+            else:
+                res = await self.forward_buffered(request, method, backend, headers, json_object)
+        except httpx.TransportError:
+            res = CommonAPIResponse.BackendDisconnected
+        except asyncio.CancelledError:
+            backend_state.on_cancel()
+            if limiter is not None:
+                limiter.release()
+            raise
+        except BaseException:
+            backend_state.on_finish(time.perf_counter() - started, True)
+            if limiter is not None:
+                limiter.release(time.perf_counter() - started, True)
+            raise
+
+        latency = time.perf_counter() - started
+        failed = isinstance(res, APIResponse) or res.status_code in BACKEND_FAILURE_STATUS_CODES
+        backend_state.on_finish(latency, failed)
+        context.backend_failed = failed
+        if limiter is not None:
+            # a streamed body keeps the backend busy until the client has read all of it
+            if streaming:
+                context.add_finish_callback(lambda: limiter.release())
+            else:
+                limiter.release(latency, failed)
+        if not failed:
+            context.route.route_info_function.latency_tracker.record(latency)
+        return res
+
+    async def forward_buffered(self, request: Request, method: str, backend: str, headers: MutableHeaders, json_object: Optional[JsonBody]) -> Response:
         if json_object is not None:
-            params["json"] = json_object
-        else:
-            params["data"] = await request.body()
-
-
-        params["headers"] = headers
-        params["cookies"] = cookies
-
-        if method == "GET":
-            req = requests.get(backend, **params)
-        elif method == "POST":
-            req = requests.post(backend, **params)
-        elif method == "PUT":
-            req = requests.put(backend, **params)
-        elif method == "DELETE":
-            req = requests.delete(backend, **params)
-        elif method == "PATCH":
-            req = requests.patch(backend, **params)
-        elif method == "HEAD":
-            req = requests.head(backend, **params)
-        elif method == "OPTIONS":
-            req = requests.options(backend, **params)
+            content = json_object.to_bytes()
         else:
-            return None
+            content = await request.body()
 
-        req_headers = dict(req.headers)
-        if "Content-Length" in req_headers:
-            del req_headers["Content-Length"]
-        if "Content-Encoding" in req_headers:
-            del req_headers["Content-Encoding"]
+        req, body = await self.upstream.request(method, backend, headers, content)
 
-        res = Response(
-            content=req.content,
-            status_code=req.status_code,
-            headers=req_headers,
-            media_type=req.headers.get("Content-Type")
-        )
-        for function in route.functions:
-            function.after_handle_request(request, res)
+        # compressed bodies go out untouched when the client can read them
+        exclude = ()
+        encoding = req.headers.get("content-encoding")
+        if encoding is not None and not is_encoding_accepted(request.headers.get("accept-encoding"), encoding):
+            body = self.upstream.decode_body(req, body)
+            exclude = (b"content-encoding",)
 
-        return res
+        response = Response(content=body, status_code=req.status_code)
+        response.raw_headers = self.upstream.filter_headers(req.headers.raw, exclude=exclude) + response.raw_headers
+        return response
 
-    def register_routes(self):
-        @self.app.get("/{full_path:path}")
-        @self.app.put("/{full_path:path}")
-        @self.app.post("/{full_path:path}")
-        @self.app.delete("/{full_path:path}")
-        @self.app.patch("/{full_path:path}")
-        @self.app.head("/{full_path:path}")
-        @self.app.options("/{full_path:path}")
-        async def get(request: Request, full_path: str, response: Response):
-            # print request domain
-            res = await self.process_request(request, request.method)
-            if isinstance(res, APIResponse):
-                response.status_code = res.code
-                return res.get_response_object()
-            return res
+    async def forward_streaming(self, request: Request, method: str, backend: str, headers: MutableHeaders) -> StreamingResponse:
+        # only attach a body stream when the client actually sent one, otherwise bodyless
+        # requests would be forwarded with chunked transfer encoding
+        content = None
+        if "content-length" in request.headers or "transfer-encoding" in request.headers:
+            content = request.stream()
+
+        req = await self.upstream.stream(method, backend, headers, content)
+
+        # the body is passed through untouched, so encoding and length stay valid
+        response = StreamingResponse(
+            req.aiter_raw(),
+            status_code=req.status_code,
+            background=BackgroundTask(req.aclose)
+        )
+        response.raw_headers = self.upstream.filter_headers(req.headers.raw, keep_content_length=True)
+        return response
+
+    def register_metrics_route(self):
+        if not self.metrics.is_enabled():
+            return
+
+        # a reserved path, it is served by the gateway itself and shadows any proxied route at the same path
+        @self.app.get(self.metrics.get_path())
+        async def metrics(request: Request):
+            if self.metrics.requires_authorization() and request.headers.get("Authorization") != self.config["AuthorizationAPIKey"]:
+                return PlainTextResponse("Unauthorized", status_code=CommonAPIResponse.UnAuthorized.code)
+            return PlainTextResponse(self.metrics.render(), media_type="text/plain; version=0.0.4")
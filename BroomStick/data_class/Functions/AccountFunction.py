@@ -6,8 +6,11 @@ from typing import TYPE_CHECKING
 from BroomStick.data_class.APIResponse import CommonAPIResponse
 from BroomStick.data_class.RouteFunction import RouteFunction
 from fastapi import Request
+from starlette.datastructures import MutableHeaders
 
 if TYPE_CHECKING:
+    from BroomStick.data_class.JsonBody import JsonBody
+    from BroomStick.data_class.RequestContext import RequestContext
     from BroomStick.data_class.Route import Route
 
 
@@ -23,26 +26,27 @@ class AccountFunction(RouteFunction):
     def get_public_meta_key(self):
         return self.get_config().get("publicMetaKey")
 
-    def is_allowed_to_use(self, request: Request):
+    def is_allowed_to_use(self, request: Request, context: RequestContext):
         if len(self.get_allowed_groups()) == 0:
             return CommonAPIResponse.Success
         if request.headers.get("Authorization") is None:
+            context.data["authFailure"] = "noAuthorization"
             return CommonAPIResponse.UnAuthorized
-        user = self.route.main.authenticator.get_user(authorization_token=request.headers.get("Authorization"))
+        user = context.get_user()
         if user is None:
-            print("Auth failed {No user}")
+            context.data["authFailure"] = "noUser"
             return CommonAPIResponse.UnAuthorized
         user_group = user.metadata.get("group")
         if user_group is None:
-            print("Auth failed {No group}")
+            context.data["authFailure"] = "noGroup"
             return CommonAPIResponse.UnAuthorized
         if user_group not in self.get_config().get("allowedGroups"):
-            print("Auth failed {Not allowed group}")
+            context.data["authFailure"] = "groupNotAllowed"
             return CommonAPIResponse.UnAuthorized
         return CommonAPIResponse.Success
 
-    def handle_request(self, request: Request, headers: dict, cookies: dict, json: dict):
-        user_object = self.route.main.authenticator.get_user(authorization_token=request.headers.get("Authorization"))
+    def handle_request(self, request: Request, headers: MutableHeaders, cookies: dict, json: JsonBody, context: RequestContext):
+        user_object = context.get_user()
         if user_object is None:
             if len(self.get_allowed_groups()) == 0:
                 return CommonAPIResponse.Success
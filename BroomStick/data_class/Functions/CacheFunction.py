@@ -1,27 +1,36 @@
 from __future__ import annotations
 
-import re
-from datetime import datetime
-from typing import TYPE_CHECKING
+import asyncio
+import hashlib
+import traceback
+from typing import TYPE_CHECKING, Optional
+from urllib.parse import parse_qsl
 
+from BroomStick.Cache.CachedResponse import CachedResponse, is_storable
 from BroomStick.data_class.APIResponse import APIResponse, CommonAPIResponse
+from BroomStick.data_class.RequestContext import RequestContext
 from BroomStick.data_class.RouteFunction import RouteFunction
+from BroomStick.data_class.RouteIndex import clean_path
+from BroomStick.utils.ContentEncoding import get_accepted_encodings
 from fastapi import Request, Response
+from starlette.datastructures import MutableHeaders
+from fastapi.responses import StreamingResponse
 
 if TYPE_CHECKING:
+    from BroomStick.data_class.JsonBody import JsonBody
     from BroomStick.data_class.Route import Route
 
 
+CACHEABLE_METHODS = {"GET", "HEAD"}
+CONDITIONAL_HEADERS = ("if-none-match", "if-modified-since")
+
+
 class CacheFunction(RouteFunction):
 
     def __init__(self):
         super().__init__("cache")
         self.route: Route = None
-
-        self.cached_responses_by_user = {}
-        self.last_response_time_by_user = {}
-        self.last_response_time_global = None
-        self.cached_response_global = None
+        self.refresh_tasks = set()
 
     def interval(self):
         return self.get_config().get("interval")
@@ -32,42 +41,220 @@ class CacheFunction(RouteFunction):
     def global_cached(self):
         return self.get_config().get("globalCached")
 
-    def handle_request(self, request: Request, headers: dict, cookies: dict, json: dict):
-        if self.interval == 0:
-            return CommonAPIResponse.Success
+    def get_vary_headers(self):
+        return self.get_config().get("varyHeaders", [])
+
+    def get_cacheable_status_codes(self):
+        return self.get_config().get("statusCodes", [200])
+
+    def single_flight(self):
+        return self.get_config().get("singleFlight", False)
+
+    def single_flight_timeout(self):
+        return self.get_config().get("singleFlightTimeout", 30)
+
+    def stale_while_revalidate(self):
+        return self.get_config().get("staleWhileRevalidate", 0)
+
+    def conditional(self):
+        return self.get_config().get("conditional", True)
 
-        current_time = datetime.now().timestamp()
+    def is_enabled(self):
+        return bool(self.interval()) and (self.user_cached() or self.global_cached())
 
-        user_object = self.route.main.authenticator.get_user(authorization_token=request.headers.get("Authorization"))
+    @staticmethod
+    def get_store_key(key: tuple) -> str:
+        return "cache:" + hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+
+    async def get_shared_entry(self, key: tuple) -> Optional[CachedResponse]:
+        # other workers may already hold the response, promote it into the local cache
+        data = await self.route.main.state_store.get(self.get_store_key(key))
+        if data is None:
+            return None
+        return self.promote(key, CachedResponse.from_bytes(data))
+
+    def get_snapshot_entry(self, key: tuple) -> Optional[CachedResponse]:
+        # responses cached before the last restart, decoded only now that they are asked for
+        entry = self.route.main.cache_snapshot.take_response(key)
+        if entry is None:
+            return None
+        return self.promote(key, entry)
+
+    def promote(self, key: tuple, entry: CachedResponse) -> Optional[CachedResponse]:
+        if entry.is_expired() and not (self.stale_while_revalidate() > 0 and entry.is_stale_usable()):
+            return None
+        self.route.main.response_cache.put(key, entry)
+        return entry
+
+    def get_cache_key(self, request: Request, context: RequestContext) -> Optional[tuple]:
+        user_object = context.get_user()
         if self.user_cached() and user_object is not None:
-            user_id = user_object.user_id
-            if user_id in self.cached_responses_by_user:
-                last_request_time = self.last_response_time_by_user[user_id]
-                if current_time - last_request_time < self.interval():
-                    return self.cached_responses_by_user[user_id]
+            owner = user_object.user_id
+        elif self.global_cached():
+            owner = None
+        else:
+            return None
+
+        query = tuple(sorted(parse_qsl(request.url.query, keep_blank_values=True)))
+        vary = tuple(request.headers.get(header) for header in self.get_vary_headers())
+        # clients that accept the same encodings share an entry, which may be stored compressed
+        encodings = get_accepted_encodings(request.headers.get("accept-encoding"))
+        return request.method, request.url.hostname, clean_path(request.url.path), query, owner, vary, encodings
+
+    def respond(self, request: Request, entry: CachedResponse) -> Response:
+        if self.conditional() and entry.is_not_modified(request.headers.get("if-none-match"), request.headers.get("if-modified-since")):
+            self.route.main.response_cache.not_modified += 1
+            return entry.to_not_modified_response()
+        return entry.to_response()
+
+    def add_validators(self, headers: MutableHeaders, context: RequestContext, entry: Optional[CachedResponse]):
+        # the client's own validators are answered by the gateway, upstream is asked about the cached copy instead
+        for header in CONDITIONAL_HEADERS:
+            if header in headers:
+                del headers[header]
+        if entry is None:
+            return
+        # a content hash means nothing to the backend, only validators it sent itself are worth asking about
+        if entry.upstream_etag:
+            headers["if-none-match"] = entry.etag
+        elif entry.last_modified is not None:
+            headers["if-modified-since"] = entry.last_modified
+        else:
+            return
+        context.data["cacheRevalidate"] = entry
+
+    async def handle_request(self, request: Request, headers: MutableHeaders, cookies: dict, json: JsonBody, context: RequestContext):
+        if not self.is_enabled() or request.method not in CACHEABLE_METHODS:
+            return CommonAPIResponse.Success
+        # streamed bodies are consumed exactly once and can not be replayed from the cache,
+        # waiting on a streaming leader would only hold followers up
+        if self.route.route_info_function.is_streaming():
             return CommonAPIResponse.Success
 
-        if self.last_response_time_global is not None and self.global_cached():
-            if current_time - self.last_response_time_global < self.interval():
-                return self.cached_response_global
+        key = self.get_cache_key(request, context)
+        if key is None:
+            return CommonAPIResponse.Success
+        context.data["cacheKey"] = key
 
-        return CommonAPIResponse.Success
+        # background refreshes already own the flight for this key
+        if "cacheLeader" in context.data:
+            if self.conditional():
+                self.add_validators(headers, context, context.data.get("cacheRevalidate"))
+            return CommonAPIResponse.Success
+
+        cache = self.route.main.response_cache
+        previous = cache.peek(key) if self.conditional() else None
+        entry = cache.get(key, allow_stale=self.stale_while_revalidate() > 0)
+        if entry is None and self.route.main.state_store.is_shared():
+            entry = await self.get_shared_entry(key)
+        if entry is None:
+            entry = self.get_snapshot_entry(key)
+        if entry is not None:
+            if entry.is_expired():
+                future = cache.begin_flight(key)
+                if future is not None:
+                    self.start_refresh(request, key, future, entry)
+            return self.respond(request, entry)
+
+        if self.conditional():
+            self.add_validators(headers, context, previous)
 
-    def after_handle_request(self, request: Request, planned_response: Response) -> APIResponse:
-        if self.interval == 0:
+        if not self.single_flight():
             return CommonAPIResponse.Success
 
-        current_time = datetime.now().timestamp()
-        user_object = self.route.main.authenticator.get_user(authorization_token=request.headers.get("Authorization"))
-        if self.user_cached() and user_object is not None:
-            user_id = user_object.user_id
-            self.last_response_time_by_user[user_id] = current_time
-            self.cached_responses_by_user[user_id] = planned_response
+        future = cache.get_flight(key)
+        if future is not None:
+            try:
+                entry = await asyncio.wait_for(asyncio.shield(future), self.single_flight_timeout())
+            except asyncio.TimeoutError:
+                entry = None
+            if entry is not None:
+                return self.respond(request, entry)
+            # the leader produced nothing cacheable, fetch on our own
             return CommonAPIResponse.Success
 
-        if self.global_cached():
-            self.last_response_time_global = current_time
-            self.cached_response_global = planned_response
+        future = cache.begin_flight(key)
+        self.lead_flight(context, key, future)
+        return CommonAPIResponse.Success
+
+    def lead_flight(self, context: RequestContext, key: tuple, future: asyncio.Future):
+        context.data["cacheLeader"] = future
+        # waiters must be released even if this request never reaches after_handle_request
+        context.add_finish_callback(lambda: self.route.main.response_cache.end_flight(key, future, None))
+
+    @staticmethod
+    def detach_request(request: Request) -> Request:
+        # by the time the refresh runs the client was answered and its receive channel only reports
+        # the disconnect. cached methods carry no body, so the refresh replays the request with an empty one
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+        return Request(dict(request.scope), receive)
+
+    def start_refresh(self, request: Request, key: tuple, future: asyncio.Future, entry: CachedResponse):
+        request = self.detach_request(request)
+        context = RequestContext(self.route.main, request)
+        context.data["cacheRevalidate"] = entry
+        self.lead_flight(context, key, future)
+        task = asyncio.ensure_future(self.refresh(request, context))
+        self.refresh_tasks.add(task)
+        task.add_done_callback(self.refresh_tasks.discard)
+
+    async def refresh(self, request: Request, context: RequestContext):
+        try:
+            result = await self.route.main.process_request(request, request.method, context)
+            if isinstance(result, APIResponse):
+                print("Cache refresh failed {" + request.url.path + ": " + str(result.status) + "}")
+        except Exception:
+            traceback.print_exc()
+        finally:
+            context.finish()
+
+    async def after_handle_request(self, request: Request, planned_response: Response, context: RequestContext):
+        key = context.data.get("cacheKey")
+        if key is None:
+            return CommonAPIResponse.Success
+        cache = self.route.main.response_cache
+        if isinstance(planned_response, StreamingResponse):
+            # nothing to cache, followers are released now instead of once the stream was sent
+            if "cacheLeader" in context.data:
+                cache.end_flight(key, context.data["cacheLeader"], None)
             return CommonAPIResponse.Success
 
-        return CommonAPIResponse.Success
\ No newline at end of file
+        previous = context.data.get("cacheRevalidate")
+        revalidated = previous is not None and planned_response.status_code == 304
+        if revalidated:
+            # the cached copy is still current, it is renewed without the body crossing the wire again
+            entry = previous.revalidated(planned_response.raw_headers, self.interval(), self.stale_while_revalidate())
+            cache.revalidated += 1
+        elif planned_response.status_code in self.get_cacheable_status_codes():
+            entry = CachedResponse(
+                planned_response.status_code,
+                planned_response.raw_headers,
+                planned_response.body,
+                self.interval(),
+                self.stale_while_revalidate()
+            )
+        else:
+            return CommonAPIResponse.Success
+
+        if is_storable(planned_response.raw_headers):
+            cache.put(key, entry)
+            if "cacheLeader" in context.data:
+                cache.end_flight(key, context.data["cacheLeader"], entry)
+            store = self.route.main.state_store
+            data = entry.to_bytes() if store.is_shared() else None
+            if data is not None:
+                await store.set(self.get_store_key(key), data, self.interval() + self.stale_while_revalidate())
+        else:
+            # followers fetch on their own, a copy cached before upstream turned private is dropped
+            cache.remove(key)
+            if "cacheLeader" in context.data:
+                cache.end_flight(key, context.data["cacheLeader"], None)
+
+        # the client's validators were kept from upstream, so the answer to them is built here
+        if revalidated or (self.conditional() and any(header in request.headers for header in CONDITIONAL_HEADERS)):
+            return self.respond(request, entry)
+        if self.conditional() and not entry.upstream_etag:
+            # the first client already gets the validator later hits are served with
+            planned_response.headers["etag"] = entry.etag
+        return CommonAPIResponse.Success
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import asyncio
+from typing import TYPE_CHECKING
+
+from BroomStick.data_class.APIResponse import APIResponse, CommonAPIResponse
+from BroomStick.data_class.RouteFunction import RouteFunction
+from BroomStick.utils.ContentEncoding import compress, select_encoding
+from fastapi import Request, Response
+from fastapi.responses import StreamingResponse
+
+if TYPE_CHECKING:
+    from BroomStick.data_class.RequestContext import RequestContext
+    from BroomStick.data_class.Route import Route
+
+
+DEFAULT_CONTENT_TYPES = ["text/", "application/json", "application/javascript", "application/xml", "image/svg+xml"]
+
+
+class CompressionFunction(RouteFunction):
+
+    def __init__(self):
+        super().__init__("compression")
+        self.route: Route = None
+
+    def is_enabled(self):
+        return self.get_config().get("enabled", False)
+
+    def get_algorithms(self):
+        return self.get_config().get("algorithms", ["br", "gzip"])
+
+    def get_min_size(self):
+        return self.get_config().get("minSize", 1024)
+
+    def get_content_types(self):
+        return self.get_config().get("contentTypes", DEFAULT_CONTENT_TYPES)
+
+    def get_level(self, algorithm):
+        return self.get_config().get("levels", {}).get(algorithm)
+
+    def get_executor_threshold(self):
+        return self.get_config().get("executorThreshold", 256 * 1024)
+
+    def is_compressible_type(self, content_type):
+        if content_type is None:
+            return False
+        content_type = content_type.partition(";")[0].strip().lower()
+        for allowed in self.get_content_types():
+            # entries ending in a slash allow a whole family such as text/
+            if content_type == allowed or (allowed.endswith("/") and content_type.startswith(allowed)):
+                return True
+        return False
+
+    async def after_handle_request(self, request: Request, planned_response: Response, context: RequestContext) -> APIResponse:
+        if not self.is_enabled() or isinstance(planned_response, StreamingResponse):
+            return CommonAPIResponse.Success
+        if planned_response.status_code < 200 or planned_response.status_code in (204, 206, 304):
+            return CommonAPIResponse.Success
+        body = planned_response.body
+        if len(body) < self.get_min_size():
+            return CommonAPIResponse.Success
+        headers = planned_response.headers
+        if "content-encoding" in headers or not self.is_compressible_type(headers.get("content-type")):
+            return CommonAPIResponse.Success
+        algorithm = select_encoding(request.headers.get("accept-encoding"), self.get_algorithms())
+        if algorithm is None:
+            return CommonAPIResponse.Success
+
+        # large bodies are compressed off the event loop so other requests keep moving
+        level = self.get_level(algorithm)
+        if len(body) >= self.get_executor_threshold():
+            compressed = await asyncio.get_event_loop().run_in_executor(None, compress, body, algorithm, level)
+        else:
+            compressed = compress(body, algorithm, level)
+        if len(compressed) >= len(body):
+            return CommonAPIResponse.Success
+
+        # edited in place so later functions, the response cache included, see the compressed variant
+        planned_response.body = compressed
+        headers["content-length"] = str(len(compressed))
+        headers["content-encoding"] = algorithm
+        vary = headers.get("vary")
+        if vary is None:
+            headers["vary"] = "Accept-Encoding"
+        elif "accept-encoding" not in vary.lower() and vary.strip() != "*":
+            headers["vary"] = vary + ", Accept-Encoding"
+        etag = headers.get("etag")
+        if etag is not None and not etag.startswith("W/"):
+            headers["etag"] = "W/" + etag
+        return CommonAPIResponse.Success
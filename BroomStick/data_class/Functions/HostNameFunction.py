@@ -8,6 +8,7 @@ from BroomStick.data_class.RouteFunction import RouteFunction
 from fastapi import Request
 
 if TYPE_CHECKING:
+    from BroomStick.data_class.RequestContext import RequestContext
     from BroomStick.data_class.Route import Route
 
 
@@ -24,7 +25,7 @@ class HostNameFunction(RouteFunction):
     def get_allowed_hosts(self):
         return self.get_config().get("allowedHosts", [])
 
-    def is_allowed_to_use(self, request: Request) -> APIResponse:
+    def is_allowed_to_use(self, request: Request, context: RequestContext) -> APIResponse:
         allowed_hosts = self.get_allowed_hosts()
         if len(allowed_hosts) == 0:
             return CommonAPIResponse.Success
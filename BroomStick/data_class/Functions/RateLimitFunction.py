@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import hashlib
+from typing import TYPE_CHECKING
+
+from BroomStick.RateLimit.LocalRateLimiter import LocalRateLimiter, TOKEN_BUCKET
+from BroomStick.RateLimit.StoreRateLimiter import StoreRateLimiter
+from BroomStick.data_class.APIResponse import APIResponse, CommonAPIResponse
+from BroomStick.data_class.RouteFunction import RouteFunction
+from fastapi import Request
+
+if TYPE_CHECKING:
+    from BroomStick.data_class.RequestContext import RequestContext
+    from BroomStick.data_class.Route import Route
+
+
+class RateLimitFunction(RouteFunction):
+
+    def __init__(self):
+        super().__init__("rateLimit")
+        self.route: Route = None
+        self.limiter = None
+
+    def init(self):
+        if not self.is_enabled():
+            return
+        if self.is_shared():
+            # the shared counters only implement the sliding window
+            for key in ("algorithm", "burst"):
+                if key in self.get_config():
+                    raise ValueError("rateLimit." + key + " is not supported with rateLimit.shared")
+            return
+        self.limiter = LocalRateLimiter(
+            self.get_limit(),
+            self.get_period(),
+            self.get_config().get("algorithm", TOKEN_BUCKET),
+            self.get_config().get("burst"),
+            self.get_config().get("maxKeys", 100000)
+        )
+
+    def is_enabled(self):
+        return self.get_limit() is not None
+
+    def get_limit(self):
+        return self.get_config().get("limit")
+
+    def get_period(self):
+        return self.get_config().get("period", 60)
+
+    def get_key_by(self):
+        return self.get_config().get("keyBy", "user")
+
+    def is_shared(self):
+        return self.get_config().get("shared", False)
+
+    def get_scope(self):
+        # routes with the same path on different hosts count separately
+        allowed_hosts = self.route.route_info.get("hostname", {}).get("allowedHosts", [])
+        return ",".join(sorted(allowed_hosts)) + self.route.route_info_function.get_path()
+
+    def get_client_ip(self, request: Request):
+        if self.get_config().get("trustForwardedFor", False):
+            forwarded_for = request.headers.get("x-forwarded-for")
+            if forwarded_for is not None:
+                # every trusted proxy appends the address it got the request from, entries left of those are the client's own
+                entries = [entry.strip() for entry in forwarded_for.split(",")]
+                return entries[max(0, len(entries) - self.get_config().get("trustedProxies", 1))]
+        if request.client is None:
+            return None
+        return request.client.host
+
+    def get_key(self, request: Request, context: RequestContext):
+        key_by = self.get_key_by()
+        if key_by == "route":
+            return ""
+        if key_by == "user" or key_by == "apiKey":
+            # only identities the authenticator resolved count, a user holds one api key at a time.
+            # hashed as the keys also end up in the shared store
+            user = context.get_user()
+            if user is not None:
+                return key_by[0] + ":" + hashlib.sha256(user.user_id.encode("utf-8")).hexdigest()
+        # anonymous requests fall back to the client address
+        return "i:" + str(self.get_client_ip(request))
+
+    def is_allowed_to_use(self, request: Request, context: RequestContext) -> APIResponse:
+        if not self.is_enabled():
+            return CommonAPIResponse.Success
+        key = self.get_key(request, context)
+        if self.is_shared():
+            return self.is_allowed_to_use_shared(key)
+        if self.limiter.acquire(key):
+            return CommonAPIResponse.Success
+        return CommonAPIResponse.RateLimited
+
+    async def is_allowed_to_use_shared(self, key) -> APIResponse:
+        if self.limiter is None:
+            self.limiter = StoreRateLimiter(self.route.main.state_store, self.get_scope(), self.get_limit(), self.get_period())
+        if await self.limiter.acquire(key):
+            return CommonAPIResponse.Success
+        return CommonAPIResponse.RateLimited
@@ -1,47 +1,137 @@
 from __future__ import annotations
 
 import re
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Optional
 
+from BroomStick.Admission.ConcurrencyLimiter import ConcurrencyLimiter
+from BroomStick.LoadBalancer.Balancers import create_balancer
+from BroomStick.LoadBalancer.LoadBalancer import LoadBalancer
+from BroomStick.Retry.LatencyTracker import LatencyTracker
+from BroomStick.Retry.RetryBudget import RetryBudget
 from BroomStick.data_class.RouteFunction import RouteFunction
 
 if TYPE_CHECKING:
     from BroomStick.data_class.Route import Route
 
 
+IDEMPOTENT_METHODS = ["GET", "HEAD", "OPTIONS", "PUT", "DELETE"]
+
+
 class RouteInfoFunction(RouteFunction):
 
     def __init__(self):
         super().__init__("routeInfo")
         self.cached_pattern = None
+        self.compiled_pattern = None
+        self.compiled_prefix_pattern = None
+        self.balancer: LoadBalancer = None
+        self.retry_budget: RetryBudget = None
+        self.concurrency_limiter: ConcurrencyLimiter = None
+        self.latency_tracker = LatencyTracker()
         self.route: Route = None
     
     def init(self):
         self.cached_pattern = self.get_path_pattern()
+        if self.cached_pattern is not None:
+            self.compiled_pattern = re.compile(r"^" + self.cached_pattern)
+            self.compiled_prefix_pattern = re.compile(self.cached_pattern)
 
     def get_path(self):
         return self.get_config()["path"]
 
     def get_backends(self):
-        return self.get_config()["backends"]
+        # backends are either plain urls or {"url": ..., "weight": ...}
+        return [backend["url"] if isinstance(backend, dict) else backend for backend in self.get_config()["backends"]]
+
+    def get_backend_weights(self):
+        return [int(backend.get("weight", 1)) if isinstance(backend, dict) else 1 for backend in self.get_config()["backends"]]
+
+    def get_health_check_config(self):
+        return self.get_config().get("healthCheck")
+
+    def get_balancer_config(self):
+        balancer = self.get_config().get("balancer", "random")
+        if isinstance(balancer, str):
+            return {"type": balancer}
+        return balancer
+
+    def get_balancer(self) -> LoadBalancer:
+        # built on first use since backend state lives in the registry of the running gateway
+        if self.balancer is None:
+            config = self.get_balancer_config()
+            registry = self.route.main.backend_registry
+            backends = [registry.get(url) for url in self.get_backends()]
+            self.balancer = create_balancer(config.get("type", "random"), backends, self.get_backend_weights(), config)
+        return self.balancer
+
+    def get_retry_config(self):
+        return self.get_config().get("retry", {})
+
+    def get_hedge_config(self):
+        return self.get_config().get("hedge", {})
+
+    def get_retry_attempts(self, method):
+        config = self.get_retry_config()
+        if method not in config.get("methods", IDEMPOTENT_METHODS):
+            return 0
+        return config.get("attempts", 0)
+
+    def get_retry_status_codes(self):
+        return self.get_retry_config().get("statusCodes", [502, 503, 504])
+
+    def is_hedged(self, method):
+        config = self.get_hedge_config()
+        return config.get("enabled", False) and method in config.get("methods", IDEMPOTENT_METHODS)
+
+    def get_hedge_delay(self):
+        config = self.get_hedge_config()
+        delay = config.get("delay")
+        if delay is None:
+            delay = self.latency_tracker.get_percentile(config.get("percentile", 0.95), config.get("minSamples", 20))
+            if delay is None:
+                return None
+        return max(config.get("minDelay", 0.005), delay)
+
+    def get_retry_budget(self) -> RetryBudget:
+        if self.retry_budget is None:
+            config = self.get_retry_config()
+            self.retry_budget = RetryBudget(config.get("budgetRatio", 0.2), config.get("minRetriesPerSecond", 5), config.get("budgetBurst", 20))
+        return self.retry_budget
+
+    def get_concurrency_limiter(self) -> Optional[ConcurrencyLimiter]:
+        config = self.get_config().get("concurrency")
+        if config is None:
+            return None
+        if self.concurrency_limiter is None:
+            self.concurrency_limiter = ConcurrencyLimiter(config)
+        return self.concurrency_limiter
+
+    def get_access_log_sample_rate(self):
+        return self.get_config().get("accessLogSampleRate")
 
     def should_remove_prefix(self):
         return self.get_config()["removePrefix"]
 
+    def is_streaming(self):
+        return self.get_config().get("streaming", False)
+
     def get_path_pattern(self):
         if self.get_path() is None:
             return None
         pattern = re.sub(r"<.*?>", ".*", re.escape(self.get_path()))
         return pattern
 
+    def get_literal_prefix(self):
+        return self.get_path().partition("<")[0]
+
     def matches_path(self, request_path):
         if self.get_path() is None:
             return False
         route = self.clean_path(request_path)
-        match = re.match(r"^" + self.cached_pattern + ".*$", route)
-        if match is not None:
-            return True
-        return False
+        return self.compiled_pattern.match(route) is not None
+
+    def remove_prefix(self, path):
+        return self.compiled_prefix_pattern.sub("", path)
 
     def clean_path(self, path, remove_path_params=True):
         # Remove path parameters if they exist
@@ -0,0 +1,84 @@
+import json
+from collections.abc import MutableMapping
+from typing import Any, Optional
+
+
+def is_json_content_type(content_type: Optional[str]) -> bool:
+    if content_type is None:
+        return False
+    content_type = content_type.partition(";")[0].strip().lower()
+    return content_type == "application/json" or content_type.endswith("+json")
+
+
+class JsonBody(MutableMapping):
+
+    # JSON request body that is parsed only once a RouteFunction looks at it. reads never change
+    # what is forwarded, the original bytes go out unless the body was written to through
+    # get_writable_value(), set_value() or item assignment
+    def __init__(self, raw: bytes):
+        self.raw = raw
+        self.value = None
+        self.parsed = False
+        self.valid = False
+        self.modified = False
+
+    def get_value(self) -> Any:
+        if not self.parsed:
+            self.parsed = True
+            try:
+                self.value = json.loads(self.raw)
+                self.valid = True
+            except ValueError:
+                self.value = None
+        return self.value
+
+    def get_writable_value(self) -> Any:
+        value = self.get_value()
+        self.modified = True
+        return value
+
+    def set_value(self, value: Any):
+        self.value = value
+        self.parsed = True
+        self.valid = True
+        self.modified = True
+
+    def is_valid(self) -> bool:
+        self.get_value()
+        return self.valid
+
+    def is_modified(self) -> bool:
+        return self.modified
+
+    def to_bytes(self) -> bytes:
+        if not self.modified:
+            return self.raw
+        return json.dumps(self.value).encode("utf-8")
+
+    def get_mapping(self, writable: bool = False) -> dict:
+        value = self.get_value()
+        if not isinstance(value, dict):
+            if writable:
+                raise TypeError("request body is not a JSON object")
+            return {}
+        if writable:
+            self.modified = True
+        return value
+
+    def __getitem__(self, key):
+        return self.get_mapping()[key]
+
+    def __setitem__(self, key, value):
+        self.get_mapping(True)[key] = value
+
+    def __delitem__(self, key):
+        del self.get_mapping(True)[key]
+
+    def __contains__(self, key) -> bool:
+        return key in self.get_mapping()
+
+    def __iter__(self):
+        return iter(self.get_mapping())
+
+    def __len__(self) -> int:
+        return len(self.get_mapping())
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+
+from fastapi import Request
+
+from BroomStick.Authenticator.AuthenticatedUser import AuthenticatedUser
+
+if TYPE_CHECKING:
+    from BroomStick import BroomStick
+    from BroomStick.data_class.Route import Route
+
+
+class RequestContext:
+
+    def __init__(self, main: BroomStick, request: Request):
+        self.main: BroomStick = main
+        self.request: Request = request
+        self.route: Optional[Route] = None
+        self.backend: Optional[str] = None
+        self.backend_failed = False
+
+        self.user: Optional[AuthenticatedUser] = None
+        self.user_resolved = False
+
+        self.start_time = time.perf_counter()
+        self.last_mark_time = self.start_time
+        self.timings: Dict[str, float] = {}
+
+        # free form per request state for RouteFunctions
+        self.data: Dict[str, Any] = {}
+        self.finish_callbacks: List[Callable[[], None]] = []
+
+    def get_authorization(self) -> Optional[str]:
+        return self.request.headers.get("Authorization")
+
+    async def resolve_user(self) -> Optional[AuthenticatedUser]:
+        # resolved at most once per request, a failed lookup is remembered as well
+        if not self.user_resolved:
+            authorization = self.get_authorization()
+            if authorization is not None:
+                self.user = await self.main.authenticator.get_user(authorization_token=authorization)
+            self.user_resolved = True
+        return self.user
+
+    def get_user(self) -> Optional[AuthenticatedUser]:
+        return self.user
+
+    def mark(self, stage: str) -> float:
+        now = time.perf_counter()
+        elapsed = now - self.last_mark_time
+        self.timings[stage] = self.timings.get(stage, 0.0) + elapsed
+        self.last_mark_time = now
+        return elapsed
+
+    def get_elapsed(self) -> float:
+        return time.perf_counter() - self.start_time
+
+    def add_finish_callback(self, callback: Callable[[], None]):
+        self.finish_callbacks.append(callback)
+
+    def finish(self):
+        # runs however the request ended, including early returns and exceptions
+        callbacks = self.finish_callbacks
+        self.finish_callbacks = []
+        for callback in callbacks:
+            callback()
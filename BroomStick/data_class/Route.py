@@ -9,7 +9,9 @@ from fastapi import FastAPI, Request
 
 from BroomStick.data_class.Functions.AccountFunction import AccountFunction
 from BroomStick.data_class.Functions.CacheFunction import CacheFunction
+from BroomStick.data_class.Functions.CompressionFunction import CompressionFunction
 from BroomStick.data_class.Functions.HostNameFunction import HostNameFunction
+from BroomStick.data_class.Functions.RateLimitFunction import RateLimitFunction
 from BroomStick.data_class.Functions.RouteInfoFunction import RouteInfoFunction
 
 if TYPE_CHECKING:
@@ -26,6 +28,9 @@ class Route:
 
         self.route_info_function: RouteInfoFunction = self.register_function(RouteInfoFunction())
         self.account_function: AccountFunction = self.register_function(AccountFunction())
+        self.rate_limit_function: RateLimitFunction = self.register_function(RateLimitFunction())
+        # compression runs before the cache so compressed variants are what gets stored
+        self.compression_function: CompressionFunction = self.register_function(CompressionFunction())
         self.cache_function: CacheFunction = self.register_function(CacheFunction())
         self.hostname_function: RouteInfoFunction = self.register_function(HostNameFunction())
 
@@ -1,9 +1,12 @@
 from __future__ import annotations
 from typing import TYPE_CHECKING
 from fastapi import Request, Response
+from starlette.datastructures import MutableHeaders
 from BroomStick.data_class.APIResponse import CommonAPIResponse, APIResponse
 
 if TYPE_CHECKING:
+    from BroomStick.data_class.JsonBody import JsonBody
+    from BroomStick.data_class.RequestContext import RequestContext
     from BroomStick.data_class.Route import Route
 
 
@@ -22,11 +25,11 @@ class RouteFunction:
             return {}
         return res
 
-    def is_allowed_to_use(self, request: Request) -> APIResponse:
+    def is_allowed_to_use(self, request: Request, context: RequestContext) -> APIResponse:
         return CommonAPIResponse.Success
 
-    def handle_request(self, request: Request, headers: dict, cookies: dict, json: dict) -> APIResponse:
+    def handle_request(self, request: Request, headers: MutableHeaders, cookies: dict, json: JsonBody, context: RequestContext) -> APIResponse:
         return CommonAPIResponse.Success
 
-    def after_handle_request(self, request: Request, planned_response: Response) -> APIResponse:
+    def after_handle_request(self, request: Request, planned_response: Response, context: RequestContext) -> APIResponse:
         return CommonAPIResponse.Success
\ No newline at end of file
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+if TYPE_CHECKING:
+    from BroomStick.data_class.Route import Route
+
+
+class PathTrieNode:
+    __slots__ = ("children", "rank", "patterns")
+
+    def __init__(self):
+        self.children: Dict[str, PathTrieNode] = {}
+        self.rank: Optional[int] = None
+        self.patterns = None
+
+
+class PathMatcher:
+
+    # routes must already be ordered by priority, the position in the list is the rank
+    def __init__(self, routes: List[Route]):
+        self.routes = routes
+        self.root = PathTrieNode()
+
+        for rank, route in enumerate(routes):
+            info = route.route_info_function
+            if info.get_path() is None:
+                continue
+            # parameterized routes hang off the node of their literal prefix
+            literal_prefix = info.get_literal_prefix()
+            node = self.root
+            for char in literal_prefix:
+                child = node.children.get(char)
+                if child is None:
+                    child = PathTrieNode()
+                    node.children[char] = child
+                node = child
+            if literal_prefix != info.get_path():
+                if node.patterns is None:
+                    node.patterns = []
+                node.patterns.append((rank, info.compiled_pattern))
+            elif node.rank is None:
+                node.rank = rank
+
+    def match(self, path: str) -> Optional[Route]:
+        # routes are prefix matched, the deepest literal hit is the longest path
+        best = len(self.routes)
+        candidates = []
+        node = self.root
+        for char in path:
+            if node.rank is not None:
+                best = node.rank
+            if node.patterns is not None:
+                candidates.extend(node.patterns)
+            node = node.children.get(char)
+            if node is None:
+                break
+        else:
+            if node.rank is not None:
+                best = node.rank
+            if node.patterns is not None:
+                candidates.extend(node.patterns)
+
+        # parameterized routes only need checking if they outrank the literal hit
+        candidates.sort()
+        for rank, pattern in candidates:
+            if rank >= best:
+                break
+            if pattern.match(path) is not None:
+                best = rank
+                break
+
+        if best == len(self.routes):
+            return None
+        return self.routes[best]
+
+
+class RouteIndex:
+
+    def __init__(self, routes: List[Route]):
+        self.routes = routes
+
+        hosts = set()
+        for route in routes:
+            hosts.update(route.hostname_function.get_allowed_hosts())
+
+        any_host_routes = [route for route in routes if len(route.hostname_function.get_allowed_hosts()) == 0]
+        self.default_matcher = PathMatcher(any_host_routes)
+        self.host_matchers: Dict[str, PathMatcher] = {}
+        for host in hosts:
+            host_routes = [
+                route for route in routes
+                if len(route.hostname_function.get_allowed_hosts()) == 0 or host in route.hostname_function.get_allowed_hosts()
+            ]
+            self.host_matchers[host] = PathMatcher(host_routes)
+
+    def match(self, hostname: str, path: str) -> Optional[Route]:
+        matcher = self.host_matchers.get(hostname, self.default_matcher)
+        return matcher.match(clean_path(path))
+
+
+def clean_path(path: str) -> str:
+    path_param_index = path.find('?')
+    if path_param_index != -1:
+        path = path[:path_param_index]
+    return path.rstrip('/')
@@ -0,0 +1,44 @@
+from email.utils import parsedate_to_datetime
+
+
+# headers a 304 carries over from the full response
+NOT_MODIFIED_HEADERS = (b"cache-control", b"content-location", b"date", b"etag", b"expires", b"last-modified", b"vary")
+
+
+def parse_http_date(value):
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
+
+def strip_weak(etag):
+    if etag.startswith("W/"):
+        return etag[2:]
+    return etag
+
+
+def etag_matches(if_none_match, etag):
+    # If-None-Match uses the weak comparison, W/"a" and "a" are the same resource version
+    if etag is None:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    etag = strip_weak(etag.strip())
+    for candidate in if_none_match.split(","):
+        if strip_weak(candidate.strip()) == etag:
+            return True
+    return False
+
+
+def is_not_modified(if_none_match, if_modified_since, etag, last_modified):
+    # If-Modified-Since is only looked at when the client sent no If-None-Match
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    if if_modified_since is not None:
+        since = parse_http_date(if_modified_since)
+        modified = parse_http_date(last_modified)
+        return since is not None and modified is not None and modified <= since
+    return False
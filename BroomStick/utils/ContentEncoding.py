@@ -0,0 +1,81 @@
+import gzip
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# encodings the gateway knows about when telling clients apart in the response cache
+KNOWN_ENCODINGS = ("br", "deflate", "gzip", "zstd")
+
+
+def parse_accept_encoding(header):
+    # "gzip;q=0.8, br" -> {"gzip": 0.8, "br": 1.0}
+    result = {}
+    if not header:
+        return result
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if name == "":
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        result[name] = quality
+    return result
+
+
+def is_encoding_accepted(header, encoding, accepted=None):
+    if accepted is None:
+        accepted = parse_accept_encoding(header)
+    for name in encoding.lower().split(","):
+        name = name.strip()
+        if name == "identity" or name == "":
+            continue
+        quality = accepted.get(name, accepted.get("*", 0.0))
+        if quality <= 0:
+            return False
+    return True
+
+
+def get_accepted_encodings(header):
+    accepted = parse_accept_encoding(header)
+    return tuple(encoding for encoding in KNOWN_ENCODINGS if is_encoding_accepted(header, encoding, accepted))
+
+
+def select_encoding(header, algorithms):
+    # highest client quality wins, ties go to the order the route lists its algorithms in
+    accepted = parse_accept_encoding(header)
+    best = None
+    best_quality = 0.0
+    for algorithm in algorithms:
+        if not is_supported(algorithm) or not is_encoding_accepted(header, algorithm, accepted):
+            continue
+        quality = accepted.get(algorithm, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best = algorithm
+            best_quality = quality
+    return best
+
+
+def is_supported(algorithm):
+    if algorithm == "br":
+        return brotli is not None
+    return algorithm in ("gzip", "deflate")
+
+
+def compress(body, algorithm, level=None):
+    if algorithm == "br":
+        return brotli.compress(body, quality=level if level is not None else 4)
+    if algorithm == "gzip":
+        return gzip.compress(body, compresslevel=level if level is not None else 6, mtime=0)
+    if algorithm == "deflate":
+        return zlib.compress(body, level if level is not None else 6)
+    raise ValueError("Unsupported compression " + str(algorithm))
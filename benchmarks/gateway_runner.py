@@ -0,0 +1,41 @@
+import argparse
+import hashlib
+import os
+import runpy
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from memory_mongo import MemoryMongoClient
+
+BENCH_USER = {
+    "userId": "bench-user",
+    "username": "bench",
+    "password": hashlib.sha256(b"bench").hexdigest(),
+    "metadata": {"group": "User"},
+    "apiKey": "bench-api-key"
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs main.py in a benchmark work directory with an in-memory mongo.")
+    parser.add_argument("--workdir", required=True)
+    args = parser.parse_args()
+
+    import BroomStick
+
+    client = MemoryMongoClient()
+    client["BroomStick"]["users"].documents.append(dict(BENCH_USER))
+    BroomStick.AsyncIOMotorClient = lambda *a, **k: client
+
+    os.chdir(args.workdir)
+    # main.py parses its own arguments, the in-memory mongo only works for a single worker
+    sys.argv = [str(ROOT / "main.py")]
+    runpy.run_path(str(ROOT / "main.py"), run_name="__main__")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import copy
+from collections import defaultdict
+
+
+def matches(document, query):
+    return all(document.get(key) == value for key, value in query.items())
+
+
+def apply_update(document, update, inserted):
+    for key, value in update.get("$set", {}).items():
+        document[key] = value
+    for key, value in update.get("$inc", {}).items():
+        document[key] = document.get(key, 0) + value
+    if inserted:
+        for key, value in update.get("$setOnInsert", {}).items():
+            document[key] = value
+
+
+class MemoryCollection:
+
+    # just enough of the motor collection api for the gateway, without a mongod
+    def __init__(self):
+        self.documents = []
+
+    def find_document(self, query):
+        for document in self.documents:
+            if matches(document, query):
+                return document
+        return None
+
+    async def create_index(self, *args, **kwargs):
+        return None
+
+    async def find_one(self, query):
+        document = self.find_document(query)
+        return copy.deepcopy(document) if document is not None else None
+
+    async def update_one(self, query, update, upsert=False):
+        document = self.find_document(query)
+        inserted = False
+        if document is None:
+            if not upsert:
+                return None
+            document = dict(query)
+            self.documents.append(document)
+            inserted = True
+        apply_update(document, update, inserted)
+
+    async def find_one_and_update(self, query, update, upsert=False, return_document=None):
+        await self.update_one(query, update, upsert=upsert)
+        return await self.find_one(query)
+
+    async def insert_many(self, documents, ordered=True):
+        self.documents.extend(copy.deepcopy(document) for document in documents)
+
+    async def insert_one(self, document):
+        self.documents.append(copy.deepcopy(document))
+
+
+class MemoryMongoClient:
+
+    def __init__(self, *args, **kwargs):
+        self.databases = defaultdict(lambda: defaultdict(MemoryCollection))
+
+    def __getitem__(self, name):
+        return self.databases[name]
+
+    def close(self):
+        pass
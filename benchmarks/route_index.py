@@ -0,0 +1,79 @@
+import random
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from BroomStick.data_class.APIResponse import CommonAPIResponse
+from BroomStick.data_class.Route import Route
+from BroomStick.data_class.RouteIndex import RouteIndex
+
+HOSTS = ["api.example.com", "shop.example.com", "admin.example.com"]
+
+
+class FakeURL:
+    def __init__(self, hostname, path):
+        self.hostname = hostname
+        self.path = path
+
+
+class FakeRequest:
+    def __init__(self, hostname, path):
+        self.url = FakeURL(hostname, path)
+
+
+def build_routes(count):
+    routes = []
+    for i in range(count):
+        path = "/service%d/resource%d" % (i % 50, i)
+        if i % 10 == 0:
+            path += "/<id>/detail"
+        allowed_hosts = [] if i % 3 == 0 else [HOSTS[i % len(HOSTS)]]
+        routes.append(Route(None, {
+            "routeInfo": {"path": path, "backends": ["http://127.0.0.1"], "removePrefix": True},
+            "hostname": {"allowedHosts": allowed_hosts},
+            "account": {"allowedGroups": [], "publicMetaKey": []},
+            "cache": {"interval": 0}
+        }))
+    routes.sort(key=lambda x: len(x.route_info_function.get_path()), reverse=True)
+    return routes
+
+
+def linear_match(routes, request):
+    # the matching loop process_request used before the index existed
+    available_routes_for_hostname = []
+    for route in routes:
+        if route.hostname_function.is_allowed_to_use(request, None) == CommonAPIResponse.Success:
+            available_routes_for_hostname.append(route)
+    for route in available_routes_for_hostname:
+        if route.route_info_function.matches_path(request.url.path):
+            return route
+    return None
+
+
+def main():
+    random.seed(0)
+    print("%8s %14s %14s %8s" % ("routes", "linear us/op", "index us/op", "speedup"))
+    for count in (10, 100, 1000, 5000):
+        routes = build_routes(count)
+        index = RouteIndex(routes)
+        requests = []
+        for _ in range(200):
+            i = random.randrange(count)
+            path = "/service%d/resource%d/123/detail/more" % (i % 50, i)
+            requests.append(FakeRequest(random.choice(HOSTS), path))
+
+        for request in requests:
+            assert index.match(request.url.hostname, request.url.path) is linear_match(routes, request)
+
+        number = max(1, 20000 // count)
+        linear = timeit.timeit(lambda: [linear_match(routes, r) for r in requests], number=number)
+        indexed = timeit.timeit(lambda: [index.match(r.url.hostname, r.url.path) for r in requests], number=number * 10)
+        linear_us = linear / (number * len(requests)) * 1e6
+        indexed_us = indexed / (number * 10 * len(requests)) * 1e6
+        print("%8d %14.2f %14.2f %7.1fx" % (count, linear_us, indexed_us, linear_us / indexed_us))
+
+
+if __name__ == "__main__":
+    main()
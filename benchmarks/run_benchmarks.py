@@ -0,0 +1,219 @@
+import argparse
+import asyncio
+import datetime
+import json
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+import jwt
+
+ROOT = Path(__file__).resolve().parent.parent
+BENCHMARKS = Path(__file__).resolve().parent
+TOKEN_SECRET = "benchmark-secret"
+LARGE_SIZE = 1024 * 1024
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def write_workdir(workdir: Path, gateway_port: int, backend_port: int, route_count: int):
+    backend = "http://127.0.0.1:" + str(backend_port)
+    (workdir / "config").mkdir()
+    (workdir / "routes").mkdir()
+
+    config = {
+        "cors": ["*"],
+        "mongodb": "memory://",
+        "userCacheTime": 60,
+        "jwtActiveTime": 3600,
+        "tokenSecret": TOKEN_SECRET,
+        "AuthorizationAPIKey": "benchmark-admin",
+        "authenticator": {"defaultMetadata": {"group": "User"}},
+        "ssl": {"key": "", "cert": ""},
+        "listeningPort": gateway_port
+    }
+    (workdir / "config" / "config.json").write_text(json.dumps(config, indent=2))
+
+    default = {
+        "hostname": {"allowedHosts": []},
+        "routeInfo": {"path": None, "backends": [backend], "removePrefix": True},
+        "account": {"allowedGroups": [], "publicMetaKey": ["group"]},
+        "cache": {"interval": 0, "userCached": False, "globalCached": False}
+    }
+    scenarios = {
+        "default": default,
+        "routes": [
+            {"routeInfo": {"path": "/bench/open"}},
+            {"routeInfo": {"path": "/bench/auth"}, "account": {"allowedGroups": ["User"]}},
+            {"routeInfo": {"path": "/bench/cached"}, "cache": {"interval": 3600, "globalCached": True}},
+            {"routeInfo": {"path": "/bench/large"}},
+            {"routeInfo": {"path": "/bench/slow"}}
+        ]
+    }
+    (workdir / "routes" / "scenarios.json").write_text(json.dumps(scenarios, indent=2))
+
+    generated = {
+        "default": default,
+        "routes": [
+            {"routeInfo": {"path": "/gen/service%d/resource%d" % (i % 50, i)}}
+            for i in range(route_count)
+        ]
+    }
+    (workdir / "routes" / "generated.json").write_text(json.dumps(generated, indent=2))
+
+
+def create_jwt() -> str:
+    descriptor = {
+        "sub": {"userId": "bench-user"},
+        "exp": datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+    }
+    return jwt.encode(descriptor, TOKEN_SECRET)
+
+
+def get_scenarios(route_count: int, concurrency: int):
+    # name, method, path, headers, body, concurrency
+    last_route = route_count - 1
+    return [
+        ("route_matching", "GET", "/gen/service%d/resource%d/item" % (last_route % 50, last_route), {}, None, concurrency),
+        ("api_key_auth", "GET", "/bench/auth", {"Authorization": "Bearer bench-api-key"}, None, concurrency),
+        ("jwt_auth", "GET", "/bench/auth", {"Authorization": "JWT " + create_jwt()}, None, concurrency),
+        ("cache_hit", "GET", "/bench/cached", {}, None, concurrency),
+        ("large_response", "GET", "/bench/large?size=" + str(LARGE_SIZE), {}, None, concurrency),
+        ("large_request", "POST", "/bench/large", {"Content-Type": "application/octet-stream"}, b"x" * LARGE_SIZE, concurrency),
+        ("slow_backend", "GET", "/bench/slow?delay=100", {}, None, concurrency * 8),
+    ]
+
+
+def percentile(sorted_values, fraction):
+    if len(sorted_values) == 0:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def run_scenario(base_url, method, path, headers, body, concurrency, duration, warmup):
+    latencies = []
+    errors = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        async def worker(deadline, record):
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    response = await client.request(method, path, headers=headers, content=body)
+                    await response.aread()
+                    failed = response.status_code != 200
+                except httpx.HTTPError:
+                    failed = True
+                if not record:
+                    continue
+                if failed:
+                    errors += 1
+                else:
+                    latencies.append(time.perf_counter() - start)
+
+        await asyncio.gather(*[worker(time.perf_counter() + warmup, False) for _ in range(concurrency)])
+        started = time.perf_counter()
+        await asyncio.gather(*[worker(started + duration, True) for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3) if latencies else None,
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3) if latencies else None,
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else None,
+    }
+
+
+async def wait_until_ready(base_url, timeout=30):
+    deadline = time.perf_counter() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.perf_counter() < deadline:
+            try:
+                response = await client.get("/bench/open")
+                if response.status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError("gateway did not become ready at " + base_url)
+
+
+def get_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args):
+    gateway_port = free_port()
+    backend_port = free_port()
+    base_url = "http://127.0.0.1:" + str(gateway_port)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        write_workdir(Path(workdir), gateway_port, backend_port, args.routes)
+        processes = [
+            subprocess.Popen([sys.executable, str(BENCHMARKS / "stub_backend.py"), "--port", str(backend_port)]),
+            subprocess.Popen([sys.executable, str(BENCHMARKS / "gateway_runner.py"), "--workdir", workdir],
+                             stdout=subprocess.DEVNULL if not args.verbose else None,
+                             stderr=subprocess.DEVNULL if not args.verbose else None),
+        ]
+        try:
+            await wait_until_ready(base_url)
+            results = {}
+            for name, method, path, headers, body, concurrency in get_scenarios(args.routes, args.concurrency):
+                if args.only and name not in args.only:
+                    continue
+                results[name] = await run_scenario(base_url, method, path, headers, body, concurrency, args.duration, args.warmup)
+                print(name, json.dumps(results[name]), file=sys.stderr)
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.wait()
+
+    return {
+        "commit": get_commit(),
+        "timestamp": datetime.datetime.utcnow().isoformat() + "Z",
+        "python": platform.python_version(),
+        "settings": {"routes": args.routes, "concurrency": args.concurrency, "duration": args.duration, "warmup": args.warmup},
+        "scenarios": results
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gateway throughput and latency benchmarks.")
+    parser.add_argument("--routes", type=int, default=500, help="number of generated routes")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent client connections")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds measured per scenario")
+    parser.add_argument("--warmup", type=float, default=1.0, help="seconds of unmeasured load before each scenario")
+    parser.add_argument("--only", nargs="*", help="run only these scenarios")
+    parser.add_argument("--output", help="write the JSON results to this file instead of stdout")
+    parser.add_argument("--verbose", action="store_true", help="show gateway output")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
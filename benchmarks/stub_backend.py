@@ -0,0 +1,82 @@
+import argparse
+import asyncio
+import json
+from urllib.parse import parse_qs
+
+import uvicorn
+
+SMALL_BODY = json.dumps({"status": "ok", "items": list(range(20))}).encode("utf-8")
+
+# bodies sent and 304s answered, served at /stats for the revalidation checks
+STATS = {"bodies": 0, "notModified": 0}
+
+
+async def read_body(receive):
+    size = 0
+    while True:
+        message = await receive()
+        size += len(message.get("body", b""))
+        if not message.get("more_body", False):
+            return size
+
+
+async def app(scope, receive, send):
+    if scope["type"] != "http":
+        return
+    query = parse_qs(scope["query_string"].decode("latin-1"))
+    received = await read_body(receive)
+
+    delay = float(query.get("delay", ["0"])[0])
+    if delay > 0:
+        await asyncio.sleep(delay / 1000)
+
+    if scope["path"] == "/stats":
+        await send_body(send, 200, [(b"content-type", b"application/json")], json.dumps(STATS).encode("utf-8"))
+        return
+
+    headers = []
+    etag = query.get("etag", [None])[0]
+    if etag is not None:
+        etag = ('"' + etag + '"').encode("latin-1")
+        headers.append((b"etag", etag))
+        if dict(scope["headers"]).get(b"if-none-match") == etag:
+            STATS["notModified"] += 1
+            await send_body(send, 304, headers, b"")
+            return
+    STATS["bodies"] += 1
+
+    size = int(query.get("size", ["0"])[0])
+    if "count" in query:
+        body = json.dumps({"count": STATS["bodies"]}).encode("utf-8")
+        content_type = b"application/json"
+    elif size > 0:
+        body = b"x" * size
+        content_type = b"application/octet-stream"
+    elif received > 0:
+        body = json.dumps({"received": received}).encode("utf-8")
+        content_type = b"application/json"
+    else:
+        body = SMALL_BODY
+        content_type = b"application/json"
+
+    await send_body(send, 200, headers + [(b"content-type", content_type)], body)
+
+
+async def send_body(send, status, headers, body):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": headers + [(b"content-length", str(len(body)).encode("latin-1"))]
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub backend for the BroomStick benchmarks.")
+    parser.add_argument("--port", type=int, required=True)
+    args = parser.parse_args()
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning", access_log=False)
+
+
+if __name__ == "__main__":
+    main()
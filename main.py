@@ -1,3 +1,9 @@
-from BroomStick import BroomStick
+import argparse
 
-app = BroomStick()
\ No newline at end of file
+from BroomStick import run_server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="BroomStick API gateway")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, 0 starts one per core (default: config \"workers\" or 1)")
+    args = parser.parse_args()
+    run_server(args.workers)
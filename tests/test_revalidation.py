@@ -0,0 +1,117 @@
+import asyncio
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+import pytest
+
+BENCHMARKS = Path(__file__).resolve().parent.parent / "benchmarks"
+sys.path.insert(0, str(BENCHMARKS))
+
+from run_benchmarks import free_port, wait_until_ready
+
+CACHE_INTERVAL = 1.0
+
+
+def write_workdir(workdir: Path, gateway_port: int, backend_port: int):
+    backend = "http://127.0.0.1:" + str(backend_port)
+    (workdir / "config").mkdir()
+    (workdir / "routes").mkdir()
+
+    config = {
+        "cors": ["*"],
+        "mongodb": "memory://",
+        "userCacheTime": 60,
+        "jwtActiveTime": 3600,
+        "tokenSecret": "test-secret",
+        "AuthorizationAPIKey": "test-admin",
+        "authenticator": {"defaultMetadata": {"group": "User"}},
+        "ssl": {"key": "", "cert": ""},
+        "listeningPort": gateway_port
+    }
+    (workdir / "config" / "config.json").write_text(json.dumps(config, indent=2))
+
+    routes = {
+        "default": {
+            "hostname": {"allowedHosts": []},
+            "routeInfo": {"path": None, "backends": [backend], "removePrefix": True},
+            "account": {"allowedGroups": [], "publicMetaKey": []},
+            "cache": {"interval": 0, "userCached": False, "globalCached": False}
+        },
+        "routes": [
+            {"routeInfo": {"path": "/bench/open"}},
+            {"routeInfo": {"path": "/swr/count"}, "cache": {"interval": CACHE_INTERVAL, "globalCached": True, "staleWhileRevalidate": 30}},
+            {"routeInfo": {"path": "/swr/etag"}, "cache": {"interval": CACHE_INTERVAL, "globalCached": True, "staleWhileRevalidate": 30}}
+        ]
+    }
+    (workdir / "routes" / "test.json").write_text(json.dumps(routes, indent=2))
+
+
+@pytest.fixture(scope="module")
+def servers():
+    # a real gateway and stub backend, background refreshes only break once the client's request is gone
+    gateway_port = free_port()
+    backend_port = free_port()
+    base_url = "http://127.0.0.1:" + str(gateway_port)
+    backend_url = "http://127.0.0.1:" + str(backend_port)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        write_workdir(Path(workdir), gateway_port, backend_port)
+        processes = [
+            subprocess.Popen([sys.executable, str(BENCHMARKS / "stub_backend.py"), "--port", str(backend_port)]),
+            subprocess.Popen([sys.executable, str(BENCHMARKS / "gateway_runner.py"), "--workdir", workdir], stdout=subprocess.DEVNULL),
+        ]
+        try:
+            asyncio.run(wait_until_ready(base_url))
+            with httpx.Client(base_url=base_url, timeout=10) as gateway, httpx.Client(base_url=backend_url, timeout=10) as backend:
+                yield gateway, backend
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.wait()
+
+
+def test_stale_hit_refreshes_in_background(servers):
+    gateway, _ = servers
+    first = gateway.get("/swr/count?count=1").json()["count"]
+    time.sleep(CACHE_INTERVAL + 0.2)
+    stale = gateway.get("/swr/count?count=1").json()["count"]
+    time.sleep(0.5)
+    refreshed = gateway.get("/swr/count?count=1").json()["count"]
+
+    assert stale == first
+    assert refreshed > first
+
+
+def test_background_refresh_revalidates_with_304(servers):
+    gateway, backend = servers
+    gateway.get("/swr/etag?etag=v1")
+    before = backend.get("/stats").json()
+    time.sleep(CACHE_INTERVAL + 0.2)
+    gateway.get("/swr/etag?etag=v1")
+    time.sleep(0.5)
+    after = backend.get("/stats").json()
+
+    # renewed by a 304, the body did not cross the wire again
+    assert after["notModified"] == before["notModified"] + 1
+    assert after["bodies"] == before["bodies"]
+
+    response = gateway.get("/swr/etag?etag=v1")
+    assert response.status_code == 200
+    assert len(response.content) > 0
+
+
+def test_conditional_request_answered_by_gateway(servers):
+    gateway, backend = servers
+    gateway.get("/swr/etag?etag=v2")
+    before = backend.get("/stats").json()
+
+    response = gateway.get("/swr/etag?etag=v2", headers={"If-None-Match": '"v2"'})
+
+    assert response.status_code == 304
+    assert backend.get("/stats").json() == before